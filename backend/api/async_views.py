@@ -0,0 +1,102 @@
+from functools import wraps
+
+from api.cache import get_cached_catalog_response, get_cached_feed_response
+from api.views import (DownloadShoppingCartView, IngredientViewSet,
+                       RecipeViewSet, TagViewSet)
+from asgiref.sync import sync_to_async
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def cached_catalog(namespace):
+    def lookup(request):
+        return get_cached_catalog_response(namespace, request)
+    return lookup
+
+
+def cached_feed(namespace):
+    def lookup(request):
+        if 'HTTP_AUTHORIZATION' in request.META:
+            return None
+        return get_cached_feed_response(namespace, request)
+    return lookup
+
+
+def async_read_view(view, lookup=None):
+    """
+    Асинхронная обертка над представлением DRF для работы под ASGI.
+    Готовый ответ из кэша (lookup) отдается без похода в поток,
+    остальное выполняет синхронное представление через sync_to_async:
+    в Django 3.2 у ORM нет асинхронного интерфейса. Потоковый ответ
+    дочитывается в том же потоке, потому что обработчик ASGI в 3.2
+    перебирает его синхронно в цикле событий, где запросы к базе
+    запрещены.
+    """
+    sync_view = sync_to_async(view)
+    cache_lookup = None if lookup is None else sync_to_async(
+        lookup, thread_sensitive=False)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if cache_lookup is not None and request.method in READ_METHODS:
+            response = await cache_lookup(request)
+            if response is not None:
+                return response
+        response = await sync_view(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = await sync_to_async(list)(
+                response.streaming_content)
+        return response
+
+    return async_view
+
+
+recipe_list = async_read_view(
+    RecipeViewSet.as_view({'get': 'list', 'post': 'create'}),
+    cached_feed(RecipeViewSet.feed_cache_namespace),
+)
+recipe_feed = async_read_view(
+    RecipeViewSet.as_view(
+        {'get': 'feed'}, detail=False, **RecipeViewSet.feed.kwargs),
+)
+recipe_by_ingredients = async_read_view(
+    RecipeViewSet.as_view(
+        {'get': 'by_ingredients'}, detail=False,
+        **RecipeViewSet.by_ingredients.kwargs),
+)
+recipe_detail = async_read_view(
+    RecipeViewSet.as_view({
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }),
+    cached_feed(RecipeViewSet.feed_cache_namespace),
+)
+tag_list = async_read_view(
+    TagViewSet.as_view({'get': 'list', 'post': 'create'}),
+    cached_catalog(TagViewSet.cache_namespace),
+)
+tag_detail = async_read_view(
+    TagViewSet.as_view({
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }),
+    cached_catalog(TagViewSet.cache_namespace),
+)
+ingredient_list = async_read_view(
+    IngredientViewSet.as_view({'get': 'list', 'post': 'create'}),
+    cached_catalog(IngredientViewSet.cache_namespace),
+)
+ingredient_detail = async_read_view(
+    IngredientViewSet.as_view({
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }),
+    cached_catalog(IngredientViewSet.cache_namespace),
+)
+download_shopping_cart = async_read_view(DownloadShoppingCartView.as_view())
@@ -0,0 +1,187 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.db import transaction
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag, urlencode)
+from rest_framework.renderers import JSONRenderer
+
+
+def get_version(namespace):
+    """
+    Версия раздела кэша: время последнего изменения данных.
+    Она входит в ключи, поэтому смена версии сразу делает
+    недействительными все сохраненные ответы раздела.
+    """
+    key = f'{namespace}:version'
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(namespace):
+    cache.set(f'{namespace}:version', time.time_ns(), None)
+
+
+def bump_version_on_commit(namespace):
+    """Новая версия после коммита, чтобы кэш не запомнил старые данные."""
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag in parse_etags(if_none_match)
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return (
+        if_modified_since is not None
+        and last_modified <= if_modified_since
+    )
+
+
+def get_catalog_cache_key(namespace, request):
+    """Ключ ответа справочника и время последнего изменения данных."""
+    version = get_version(namespace)
+    key = (
+        f'{namespace}:{version}:'
+        f'{hashlib.md5(request.get_full_path().encode()).hexdigest()}'
+    )
+    return key, version // 10 ** 9
+
+
+def get_catalog_response(request, cached, last_modified):
+    body, etag = cached
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def get_cached_catalog_response(namespace, request):
+    """Готовый ответ справочника из кэша или None, без запросов к базе."""
+    key, last_modified = get_catalog_cache_key(namespace, request)
+    cached = cache.get(key)
+    if cached is None:
+        return None
+    return get_catalog_response(request, cached, last_modified)
+
+
+class CachedCatalogMixin:
+    """
+    Кэширует list/retrieve справочников готовыми JSON-байтами
+    и отвечает 304 на If-None-Match / If-Modified-Since.
+    """
+    cache_namespace = None
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        key, last_modified = get_catalog_cache_key(
+            self.cache_namespace, request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = JSONRenderer().render(response.data)
+            cached = (body, quote_etag(hashlib.md5(body).hexdigest()))
+            cache.set(key, cached, settings.CATALOG_CACHE_TIMEOUT)
+        return get_catalog_response(request, cached, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+
+def get_feed_cache_key(namespace, request):
+    params = urlencode(sorted(
+        (key, value)
+        for key in request.GET
+        for value in request.GET.getlist(key)
+    ))
+    path = f'{request.get_host()}{request.path}?{params}'
+    return f'{namespace}:feed:{hashlib.md5(path.encode()).hexdigest()}'
+
+
+def is_fresh_feed_entry(entry, version):
+    return (
+        entry is not None and entry['version'] == version
+        and time.time() < entry['expires']
+    )
+
+
+def get_cached_feed_response(namespace, request):
+    """Свежий ответ ленты из кэша или None, без запросов к базе."""
+    entry = cache.get(get_feed_cache_key(namespace, request))
+    if not is_fresh_feed_entry(entry, get_version(namespace)):
+        return None
+    return HttpResponse(entry['body'], content_type='application/json')
+
+
+class AnonymousFeedCacheMixin:
+    """
+    Кэш ответов list/retrieve рецептов для анонимных пользователей.
+    Ключ строится по пути и отсортированным параметрам запроса,
+    а версия данных хранится в самой записи. Устаревшую запись
+    пересчитывает и сохраняет один запрос, захвативший блокировку,
+    остальные в это время получают устаревший ответ
+    (stale-while-revalidate), а без записи считают ответ сами,
+    не дожидаясь и не сохраняя его: воркер не простаивает.
+    """
+    feed_cache_namespace = 'recipes'
+
+    def get_feed_response(self, request, handler, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        version = get_version(self.feed_cache_namespace)
+        key = get_feed_cache_key(self.feed_cache_namespace, request)
+        entry = cache.get(key)
+        if is_fresh_feed_entry(entry, version):
+            return HttpResponse(entry['body'], content_type='application/json')
+
+        lock = f'{key}:lock'
+        # Блокировку снимает только ее владелец: по истечении таймаута
+        # ее может захватить другой запрос.
+        token = uuid.uuid4().hex
+        if not cache.add(lock, token, settings.RECIPE_FEED_LOCK_TIMEOUT):
+            if entry is not None:
+                return HttpResponse(
+                    entry['body'], content_type='application/json')
+            return handler(request, *args, **kwargs)
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = JSONRenderer().render(response.data)
+            cache.set(key, {
+                'version': version,
+                'expires': time.time() + settings.RECIPE_FEED_CACHE_TIMEOUT,
+                'body': body,
+            }, (
+                settings.RECIPE_FEED_CACHE_TIMEOUT
+                + settings.RECIPE_FEED_STALE_TIMEOUT
+            ))
+        finally:
+            if cache.get(lock) == token:
+                cache.delete(lock)
+        return HttpResponse(body, content_type='application/json')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_feed_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_feed_response(
+            request, super().retrieve, *args, **kwargs)
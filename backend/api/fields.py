@@ -0,0 +1,106 @@
+import base64
+import binascii
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+IMAGE_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'GIF': ('gif', 'image/gif'),
+    'WEBP': ('webp', 'image/webp'),
+}
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+BASE64_CHUNK_SIZE = 64 * 1024 * 4
+
+
+class ImageRenditionsField(serializers.Field):
+    """
+    Карта уменьшенных копий изображения рецепта в духе srcset:
+    {'webp': {'320': url, '640': url}, 'jpeg': {...}}.
+    Пока копии строятся в фоне, отдается пустой словарь.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'image_renditions'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        srcset = {}
+        for file_format, names in renditions.items():
+            if file_format == 'source':
+                continue
+            srcset[file_format] = {}
+            for width, name in names.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                srcset[file_format][width] = url
+        return srcset
+
+
+class StreamingImageField(serializers.ImageField):
+    """
+    Изображение строкой base64 (data URI) или файлом multipart/form-data.
+    Base64 декодируется кусками во временный файл, который остается
+    в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE и уходит на диск дальше.
+    По заголовку проверяются формат, размеры и защита от декомпрессионной
+    бомбы, пиксели в запросе не декодируются. Очистка оригинала
+    от метаданных и уменьшенные копии делаются в фоне.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Загрузите корректное изображение в base64.',
+        'invalid_image': 'Загрузите корректное изображение.',
+        'too_large': 'Изображение больше {max_size} байт.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = self.decode_base64(data)
+        file = super(serializers.ImageField, self).to_internal_value(data)
+        if file.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        extension, content_type = self.check_image(file)
+        file.name = f'{uuid.uuid4()}.{extension}'
+        file.content_type = content_type
+        return file
+
+    def decode_base64(self, data):
+        # Срезы по кускам, чтобы не копировать всю строку без заголовка.
+        offset = data.find(';base64,')
+        offset = 0 if offset == -1 else offset + len(';base64,')
+        if (len(data) - offset) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        file = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            for start in range(offset, len(data), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[start:start + BASE64_CHUNK_SIZE], validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        size = file.tell()
+        file.seek(0)
+        return UploadedFile(file, name=str(uuid.uuid4()), size=size)
+
+    def check_image(self, file):
+        try:
+            file.seek(0)
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if image_format not in IMAGE_FORMATS or not width or not height:
+            self.fail('invalid_image')
+        return IMAGE_FORMATS[image_format]
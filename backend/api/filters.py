@@ -1,9 +1,13 @@
 from django.contrib.auth import get_user_model
 from django_filters import rest_framework as filters
+from recipes.memberships import get_memberships
 from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 
 User = get_user_model()
 
+RECIPE_ORDERING_FIELDS = ('pub_date', 'favorites_count')
+
 
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(
@@ -12,6 +16,16 @@ class IngredientFilter(filters.FilterSet):
     )
 
 
+class StableOrderingFilter(filters.OrderingFilter):
+    """Сортировка с добором по -id, чтобы страницы не пересекались."""
+
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        if value:
+            qs = qs.order_by(*qs.query.order_by, '-id')
+        return qs
+
+
 class RecipeFilter(filters.FilterSet):
     """Фильтр рецептов по автору,тегу,
     подписке, наличию в списке покупок."""
@@ -26,17 +40,30 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart',
         label='shopping_cart',)
+    search = filters.CharFilter(
+        method='filter_search',
+        label='search',)
+    ordering = StableOrderingFilter(
+        fields=RECIPE_ORDERING_FIELDS,
+    )
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
 
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию с ранжированием."""
+        if value.strip():
+            return search_recipes(queryset, value)
+        return queryset
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(
+                pk__in=get_memberships(self.request).favorites)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(pk__in=get_memberships(self.request).cart)
         return queryset
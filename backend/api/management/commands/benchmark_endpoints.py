@@ -0,0 +1,426 @@
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+
+import django
+from api.urls import router, urlpatterns
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver
+from recipes.bulk import add_recipe, add_recipes
+from recipes.follows import follow
+from recipes.models import Favorite, Ingredient, Recipe, Shopping, Tag
+from rest_framework.test import APIClient
+from users.models import Follow
+
+User = get_user_model()
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+QUIET_LOGGERS = ('api.profiling', 'django.request')
+PIXEL = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg=='
+)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    position = (len(values) - 1) * share
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def get_route_names(patterns=urlpatterns, prefix='api:'):
+    """Имена всех маршрутов api/urls.py, включая djoser."""
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= get_route_names(pattern.url_patterns, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(prefix + pattern.name)
+    return names
+
+
+class Scenario:
+    """
+    Один замеряемый запрос. setup выполняется до запроса,
+    а все изменения в базе откатываются после каждого повтора.
+    """
+
+    def __init__(self, name, route, method, url, data=None, setup=None):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.url = url
+        self.data = data
+        self.setup = setup
+
+
+class Command(BaseCommand):
+    """
+    Прогоняем запросы ко всем маршрутам api/urls.py через тестовый
+    клиент Django и считаем p50/p95 времени ответа, число SQL-запросов
+    и выделения памяти (tracemalloc) на запрос. Каждый повтор пишущего
+    запроса выполняется в точке сохранения и откатывается.
+    Результат сохраняется в JSON (--output), прошлый прогон можно
+    передать в --compare, чтобы увидеть разницу между коммитами.
+    Данные для замеров создает команда generate_fake_data.
+    """
+    help = 'Замеры эндпоинтов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email пользователя для авторизованных запросов.')
+        parser.add_argument(
+            '--repeat', type=int, default=30, help='Повторов на запрос.')
+        parser.add_argument(
+            '--warmup', type=int, default=3, help='Прогревочных повторов.')
+        parser.add_argument(
+            '--only', action='append',
+            help='Замерять только сценарии с этой подстрокой в имени.')
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='Не отключать кэш (по умолчанию DummyCache).')
+        parser.add_argument('--output', help='Сохранить результат в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.')
+
+    def get_user(self, email):
+        users = User.objects.all()
+        if email:
+            users = users.filter(email=email)
+        else:
+            users = users.filter(follower__isnull=False).distinct()
+        user = users.order_by('pk').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователя для запросов, запустите generate_fake_data.')
+        return user
+
+    def get_scenarios(self, user):
+        recipes = list(Recipe.objects.exclude(author=user).exclude(
+            favorite__user=user).exclude(shopping_cart__user=user)[:5])
+        recipe = recipes[0] if recipes else None
+        recipe_ids = [item.pk for item in recipes]
+        own_recipe = Recipe.objects.filter(author=user).first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        authors = list(User.objects.exclude(pk=user.pk).exclude(
+            following__user=user).values_list('pk', flat=True)[:5])
+        author = User.objects.filter(pk__in=authors[:1]).first()
+        if None in (recipe, tag, ingredient, author):
+            raise CommandError('Мало данных, запустите generate_fake_data.')
+
+        new_recipe = {
+            'name': 'Замер',
+            'text': 'Рецепт для замера.',
+            'cooking_time': 10,
+            'image': PIXEL,
+            'tags': [tag.pk],
+            'ingredients': [
+                {'id': pk, 'amount': 100}
+                for pk in Ingredient.objects.values_list(
+                    'pk', flat=True)[:5]
+            ],
+        }
+        scenarios = [
+            Scenario('users-list', 'api:users-list', 'get', '/api/users/'),
+            Scenario('users-me', 'api:users-me', 'get', '/api/users/me/'),
+            Scenario(
+                'users-detail', 'api:users-detail', 'get',
+                f'/api/users/{author.pk}/'),
+            Scenario(
+                'users-subscriptions', 'api:users-subscriptions', 'get',
+                '/api/users/subscriptions/?recipes_limit=3'),
+            Scenario(
+                'users-subscribe', 'api:users-subscribe', 'post',
+                f'/api/users/{author.pk}/subscribe/'),
+            Scenario(
+                'users-unsubscribe', 'api:users-subscribe', 'delete',
+                f'/api/users/{author.pk}/subscribe/',
+                setup=lambda: follow(user, [author.pk])),
+            Scenario(
+                'users-subscribe-bulk', 'api:users-subscribe-bulk', 'post',
+                '/api/users/subscribe/', data={'authors': authors}),
+            Scenario('tags-list', 'api:tags-list', 'get', '/api/tags/'),
+            Scenario(
+                'tags-detail', 'api:tags-detail', 'get',
+                f'/api/tags/{tag.pk}/'),
+            Scenario(
+                'ingredients-list', 'api:ingredients-list', 'get',
+                '/api/ingredients/'),
+            Scenario(
+                'ingredients-search', 'api:ingredients-list', 'get',
+                '/api/ingredients/?name=сах'),
+            Scenario(
+                'ingredients-detail', 'api:ingredients-detail', 'get',
+                f'/api/ingredients/{ingredient.pk}/'),
+            Scenario(
+                'recipes-list', 'api:recipes-list', 'get', '/api/recipes/'),
+            Scenario(
+                'recipes-page-10', 'api:recipes-list', 'get',
+                '/api/recipes/?page=10'),
+            Scenario(
+                'recipes-cursor', 'api:recipes-list', 'get',
+                '/api/recipes/?cursor='),
+            Scenario(
+                'recipes-tags', 'api:recipes-list', 'get',
+                f'/api/recipes/?tags={tag.slug}'),
+            Scenario(
+                'recipes-favorited', 'api:recipes-list', 'get',
+                '/api/recipes/?is_favorited=1'),
+            Scenario(
+                'recipes-in-cart', 'api:recipes-list', 'get',
+                '/api/recipes/?is_in_shopping_cart=1'),
+            Scenario(
+                'recipes-search', 'api:recipes-list', 'get',
+                f'/api/recipes/?search={recipe.name.split()[0]}'),
+            Scenario(
+                'recipes-by-ingredients', 'api:recipes-by-ingredients',
+                'get', '/api/recipes/by_ingredients/?ids=' + ','.join(
+                    str(ingredient['id'])
+                    for ingredient in new_recipe['ingredients'])),
+            Scenario(
+                'recipes-feed', 'api:recipes-feed', 'get',
+                '/api/recipes/feed/'),
+            Scenario(
+                'recipes-feed-cursor', 'api:recipes-feed', 'get',
+                '/api/recipes/feed/?cursor='),
+            Scenario(
+                'recipes-detail', 'api:recipes-detail', 'get',
+                f'/api/recipes/{recipe.pk}/'),
+            Scenario(
+                'recipes-create', 'api:recipes-list', 'post',
+                '/api/recipes/', data=new_recipe),
+            Scenario(
+                'recipes-favorite', 'api:recipes-favorite', 'post',
+                f'/api/recipes/{recipe.pk}/favorite/'),
+            Scenario(
+                'recipes-unfavorite', 'api:recipes-favorite', 'delete',
+                f'/api/recipes/{recipe.pk}/favorite/',
+                setup=lambda: Favorite.objects.create(
+                    user=user, recipe=recipe)),
+            Scenario(
+                'recipes-shopping-cart', 'api:recipes-shopping-cart',
+                'post', f'/api/recipes/{recipe.pk}/shopping_cart/',
+                data={'servings': 2}),
+            Scenario(
+                'recipes-shopping-cart-servings', 'api:recipes-shopping-cart',
+                'patch', f'/api/recipes/{recipe.pk}/shopping_cart/',
+                data={'servings': 3},
+                setup=lambda: add_recipe(Shopping, user, recipe.pk)),
+            Scenario(
+                'recipes-shopping-cart-remove', 'api:recipes-shopping-cart',
+                'delete', f'/api/recipes/{recipe.pk}/shopping_cart/',
+                setup=lambda: add_recipe(Shopping, user, recipe.pk)),
+            Scenario(
+                'recipes-favorite-bulk', 'api:recipes-favorite-bulk', 'post',
+                '/api/recipes/favorite/', data={'recipes': recipe_ids}),
+            Scenario(
+                'recipes-unfavorite-bulk', 'api:recipes-favorite-bulk',
+                'delete', '/api/recipes/favorite/',
+                data={'recipes': recipe_ids},
+                setup=lambda: add_recipes(Favorite, user, recipe_ids)),
+            Scenario(
+                'recipes-shopping-cart-bulk', 'api:recipes-shopping-cart-bulk',
+                'post', '/api/recipes/shopping_cart/',
+                data={'recipes': recipe_ids, 'servings': 2}),
+            Scenario(
+                'download-shopping-cart', 'api:download_shopping_cart',
+                'get', '/api/recipes/download_shopping_cart/'),
+            Scenario(
+                'download-shopping-cart-pdf', 'api:download_shopping_cart',
+                'get', '/api/recipes/download_shopping_cart/?format=pdf'),
+        ]
+        if own_recipe is not None:
+            scenarios += [
+                Scenario(
+                    'recipes-update', 'api:recipes-detail', 'patch',
+                    f'/api/recipes/{own_recipe.pk}/', data=new_recipe),
+                Scenario(
+                    'recipes-delete', 'api:recipes-detail', 'delete',
+                    f'/api/recipes/{own_recipe.pk}/'),
+            ]
+        return scenarios
+
+    @contextmanager
+    def rollback(self):
+        savepoint = transaction.savepoint()
+        try:
+            yield
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    def request(self, client, scenario):
+        with self.rollback():
+            if scenario.setup is not None:
+                scenario.setup()
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(client, scenario.method)(
+                    scenario.url, scenario.data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(context.captured_queries)
+
+    def measure_allocations(self, client, scenario):
+        with self.rollback():
+            if scenario.setup is not None:
+                scenario.setup()
+            tracemalloc.start()
+            try:
+                before = tracemalloc.take_snapshot()
+                response = getattr(client, scenario.method)(
+                    scenario.url, scenario.data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                after = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        stats = after.compare_to(before, 'filename')
+        return {
+            'alloc_kb': round(
+                sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+                / 1024, 1),
+            'alloc_blocks': sum(
+                stat.count_diff for stat in stats if stat.count_diff > 0),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def run_scenario(self, client, scenario, repeat, warmup):
+        for _ in range(warmup):
+            self.request(client, scenario)
+        statuses, timings, queries = set(), [], []
+        for _ in range(repeat):
+            status, elapsed, count = self.request(client, scenario)
+            statuses.add(status)
+            timings.append(elapsed * 1000)
+            queries.append(count)
+        return {
+            'route': scenario.route,
+            'method': scenario.method.upper(),
+            'url': scenario.url,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries': max(queries),
+            **self.measure_allocations(client, scenario),
+        }
+
+    @staticmethod
+    def get_commit():
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def get_meta(self, options, user):
+        return {
+            'commit': self.get_commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cache': bool(options['cache']),
+            'repeat': options['repeat'],
+            'user': user.email,
+            'data': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'carts': Shopping.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        }
+
+    def print_result(self, name, result, previous):
+        line = (
+            f'{name:<30} {"/".join(map(str, result["status"])):<8}'
+            f'p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'запросов {result["queries"]:>3}  '
+            f'память {result["alloc_kb"]:>8.1f} КБ'
+        )
+        if previous is not None:
+            line += (
+                f'  | p50 {result["p50_ms"] - previous["p50_ms"]:+.2f} мс,'
+                f' запросов {result["queries"] - previous["queries"]:+d}'
+            )
+        self.stdout.write(line)
+
+    def load_previous(self, path):
+        if not path:
+            return {}
+        try:
+            with open(path, 'r', encoding='UTF-8') as previous:
+                return json.load(previous)['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть больше нуля.')
+        previous = self.load_previous(options['compare'])
+        user = self.get_user(options['user'])
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+
+        loggers = [logging.getLogger(name) for name in QUIET_LOGGERS]
+        levels = [logger.level for logger in loggers]
+        for logger in loggers:
+            logger.setLevel(logging.CRITICAL)
+        overrides = {} if options['cache'] else {'CACHES': DUMMY_CACHES}
+        results = {}
+        try:
+            with ExitStack() as stack:
+                media_root = stack.enter_context(tempfile.TemporaryDirectory())
+                stack.enter_context(
+                    override_settings(MEDIA_ROOT=media_root, **overrides))
+                stack.enter_context(transaction.atomic())
+                scenarios = self.get_scenarios(user)
+                for scenario in scenarios:
+                    if options['only'] and not any(
+                        part in scenario.name for part in options['only']
+                    ):
+                        continue
+                    results[scenario.name] = self.run_scenario(
+                        client, scenario,
+                        options['repeat'], options['warmup'])
+                    self.print_result(
+                        scenario.name, results[scenario.name],
+                        previous.get(scenario.name))
+                transaction.set_rollback(True)
+        finally:
+            for logger, level in zip(loggers, levels):
+                logger.setLevel(level)
+
+        covered = {scenario.route for scenario in scenarios}
+        missing = sorted(
+            get_route_names() - covered - {f'api:{router.root_view_name}'})
+        if missing:
+            self.stdout.write(f'Без сценария: {", ".join(missing)}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as output:
+                json.dump({
+                    'meta': self.get_meta(options, user),
+                    'results': results,
+                }, output, ensure_ascii=False, indent=2)
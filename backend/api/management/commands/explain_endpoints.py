@@ -0,0 +1,111 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from recipes.models import Recipe, Tag
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+DUMMY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+class Command(BaseCommand):
+    """
+    Выполняем GET-запросы ко всем маршрутам api/urls.py
+    и печатаем план (EXPLAIN) каждого SQL-запроса.
+    Сохраненные через --output результаты до и после миграции
+    с индексами удобно сравнивать diff'ом.
+    """
+    help = 'Планы SQL-запросов для эндпоинтов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email пользователя для авторизованных запросов.')
+        parser.add_argument('--output', help='Сохранить результат в JSON.')
+
+    def get_endpoints(self):
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        tag = Tag.objects.first()
+        author = recipe.author if recipe else self.user
+        endpoints = {
+            'users-list': '/api/users/',
+            'users-me': '/api/users/me/',
+            'users-detail': f'/api/users/{author.pk}/',
+            'users-subscriptions': '/api/users/subscriptions/?recipes_limit=3',
+            'tags-list': '/api/tags/',
+            'ingredients-list': '/api/ingredients/',
+            'ingredients-search': '/api/ingredients/?name=сах',
+            'recipes-list': '/api/recipes/',
+            'recipes-author': f'/api/recipes/?author={author.pk}',
+            'recipes-favorited': '/api/recipes/?is_favorited=1',
+            'recipes-shopping-cart': '/api/recipes/?is_in_shopping_cart=1',
+            'recipes-cursor': '/api/recipes/?cursor=',
+            'recipes-search': '/api/recipes/?search=суп',
+            'download-shopping-cart': '/api/recipes/download_shopping_cart/',
+        }
+        if tag is not None:
+            endpoints['tags-detail'] = f'/api/tags/{tag.pk}/'
+            endpoints['recipes-tags'] = f'/api/recipes/?tags={tag.slug}'
+        if recipe is not None:
+            endpoints['recipes-detail'] = f'/api/recipes/{recipe.pk}/'
+        return endpoints
+
+    @staticmethod
+    def explain(sql):
+        if connection.vendor == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        else:
+            prefix = 'EXPLAIN '
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(prefix + sql)
+            except Exception as error:
+                return [f'не удалось получить план: {error}']
+            return [
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            ]
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(email=options['user'])
+        self.user = users.order_by('pk').first()
+        if self.user is None:
+            raise CommandError('Нет пользователя для запросов.')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        results = {}
+        with override_settings(CACHES=DUMMY_CACHES):
+            for name, url in self.get_endpoints().items():
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                queries = [
+                    {'sql': query['sql'], 'plan': self.explain(query['sql'])}
+                    for query in context.captured_queries
+                    if query['sql'].lstrip().upper().startswith('SELECT')
+                ]
+                results[name] = {
+                    'url': url,
+                    'status': response.status_code,
+                    'queries': queries,
+                }
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name} {url} -> {response.status_code}, '
+                    f'запросов: {len(queries)}'))
+                for query in queries:
+                    self.stdout.write(f'  {query["sql"][:200]}')
+                    for line in query['plan']:
+                        self.stdout.write(f'    {line}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,194 @@
+import json
+import socket
+import threading
+import time
+from http.client import HTTPConnection, HTTPException
+from urllib.parse import urlsplit
+
+from api.management.commands.benchmark_endpoints import percentile
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/tags/',
+    '/api/ingredients/?name=%D1%81%D0%B0%D1%85',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+class SlowClient(threading.Thread):
+    """
+    Медленный клиент: открывает соединение и передает заголовки
+    по одному байту, пока не закончится замер. Синхронный воркер
+    ждет такого клиента целиком, воркер uvicorn - нет.
+    """
+
+    def __init__(self, host, port, stop, interval):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.stop = stop
+        self.interval = interval
+
+    def run(self):
+        request = (
+            f'GET /api/tags/ HTTP/1.1\r\nHost: {self.host}\r\n'
+            'X-Slow-Client: ' + 'x' * 1000
+        ).encode()
+        try:
+            with socket.create_connection((self.host, self.port)) as sock:
+                for byte in request:
+                    if self.stop.wait(self.interval):
+                        return
+                    sock.sendall(bytes((byte,)))
+        except OSError:
+            return
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочное сравнение запущенных серверов, например
+    gunicorn на синхронных воркерах (WSGI) и на воркерах uvicorn (ASGI):
+
+        manage.py load_test --target wsgi=http://127.0.0.1:8000
+                            --target asgi=http://127.0.0.1:8001
+                            --slow-clients 50
+
+    На каждую цель по очереди подается одинаковая нагрузка из
+    --concurrency потоков, параллельно с ней --slow-clients медленных
+    клиентов держат соединения открытыми.
+    """
+    help = 'Нагрузочное сравнение WSGI и ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help='имя=http://host:port, можно указать несколько раз.')
+        parser.add_argument(
+            '--path', action='append',
+            help='Путь для запросов, по умолчанию набор чтений API.')
+        parser.add_argument(
+            '--concurrency', type=int, default=20,
+            help='Число одновременных клиентов.')
+        parser.add_argument(
+            '--duration', type=float, default=20,
+            help='Длительность замера на цель, секунд.')
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Число медленных клиентов во время замера.')
+        parser.add_argument(
+            '--slow-interval', type=float, default=1,
+            help='Пауза медленного клиента между байтами, секунд.')
+        parser.add_argument(
+            '--token', help='Токен для заголовка Authorization.')
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Таймаут одного запроса, секунд.')
+        parser.add_argument('--output', help='Сохранить результат в JSON.')
+
+    @staticmethod
+    def parse_target(target):
+        name, _, url = target.partition('=')
+        parts = urlsplit(url)
+        if not name or parts.scheme != 'http' or not parts.hostname:
+            raise CommandError(
+                f'Неверная цель {target}, ожидается имя=http://host:port')
+        return name, parts.hostname, parts.port or 80
+
+    def client(self, host, port, paths, headers, deadline, results):
+        timings, errors = [], 0
+        connection = HTTPConnection(host, port, timeout=self.timeout)
+        position = 0
+        while time.monotonic() < deadline:
+            path = paths[position % len(paths)]
+            position += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, HTTPException):
+                errors += 1
+                connection.close()
+                connection = HTTPConnection(host, port, timeout=self.timeout)
+                continue
+            if response.status >= 500:
+                errors += 1
+            else:
+                timings.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        results.append((timings, errors))
+
+    def run_target(self, host, port, options, paths, headers):
+        stop = threading.Event()
+        slow_clients = [
+            SlowClient(host, port, stop, options['slow_interval'])
+            for _ in range(options['slow_clients'])
+        ]
+        for slow_client in slow_clients:
+            slow_client.start()
+
+        results = []
+        started = time.monotonic()
+        deadline = started + options['duration']
+        clients = [
+            threading.Thread(
+                target=self.client,
+                args=(host, port, paths, headers, deadline, results))
+            for _ in range(options['concurrency'])
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+        stop.set()
+
+        timings = [timing for client, _ in results for timing in client]
+        errors = sum(client_errors for _, client_errors in results)
+        if not timings:
+            return {'requests': 0, 'errors': errors}
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 0.5), 1),
+            'p95_ms': round(percentile(timings, 0.95), 1),
+            'p99_ms': round(percentile(timings, 0.99), 1),
+        }
+
+    def handle(self, *args, **options):
+        targets = [self.parse_target(target) for target in options['target']]
+        paths = options['path'] or DEFAULT_PATHS
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        self.timeout = options['timeout']
+
+        results = {}
+        for name, host, port in targets:
+            self.stdout.write(f'{name}: {host}:{port}...')
+            result = results[name] = self.run_target(
+                host, port, options, paths, headers)
+            if not result['requests']:
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: нет успешных ответов, ошибок: '
+                    f'{result["errors"]}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {result["rps"]} запр/с, '
+                f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+                f'p99 {result["p99_ms"]} мс, ошибок {result["errors"]}'))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as output:
+                json.dump({
+                    'options': {
+                        key: options[key] for key in (
+                            'concurrency', 'duration', 'slow_clients',
+                            'slow_interval')
+                    },
+                    'paths': list(paths),
+                    'results': results,
+                }, output, ensure_ascii=False, indent=2)
@@ -1,6 +1,122 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная выдача по номеру страницы, а с параметром ?cursor=
+    выдача по ключу (keyset): WHERE (pub_date, id) < (последняя запись)
+    без OFFSET. Поля курсора записываются как в order_by, у поля
+    с минусом сортировка по убыванию. В режиме курсора COUNT(*)
+    выполняется только по запросу ?count=true.
+    """
     page_size = 10
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_fields = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Готовые списки (не QuerySet) отдаются только по номеру страницы.
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            and hasattr(queryset, 'order_by')
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = getattr(view, 'cursor_fields', self.cursor_fields)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(
+            request.query_params[self.cursor_query_param], queryset)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def get_cursor_filter(self, cursor):
+        """(a, b) < (x, y) с учетом направления каждого поля."""
+        condition = Q()
+        for position, field in enumerate(self.fields):
+            lookup = 'lt' if self.ordering[position].startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': cursor[position]})
+            for previous, value in zip(self.fields, cursor[:position]):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field) for field in self.fields]
+        return urlsafe_b64encode(json.dumps(
+            values, default=lambda value: value.isoformat()
+        ).encode()).decode()
+
+    @staticmethod
+    def get_cursor_field(queryset, name):
+        """Поле сортировки: аннотация запроса или поле модели."""
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, cursor, queryset):
+        """
+        Значения курсора, приведенные к типам полей сортировки:
+        испорченный или подделанный курсор дает 404, а не 500.
+        """
+        if not cursor:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [
+                self.get_cursor_field(queryset, field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (ValidationError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['results'] = data
+        return Response(response)
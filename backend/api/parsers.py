@@ -0,0 +1,33 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    multipart/form-data для рецептов: изображение передается отдельной
+    частью и пишется обработчиками загрузки Django на диск, не попадая
+    в память целиком. Вложенные поля (ingredients, tags) передаются
+    строками JSON, tags можно передать и повтором поля.
+    """
+    json_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key, values in parsed.data.lists():
+            if key in self.json_fields and len(values) == 1:
+                try:
+                    value = json.loads(values[0])
+                except ValueError as error:
+                    raise ParseError(f'{key}: неверный JSON - {error}')
+                data[key] = value if isinstance(value, list) else [value]
+            elif key in self.json_fields:
+                data[key] = values
+            else:
+                data[key] = values[-1]
+        # Обычный dict: Request.data объединяет data и files через
+        # dict.update, и из MultiValueDict туда попали бы списки.
+        files = {key: parsed.files[key] for key in parsed.files}
+        return DataAndFiles(data, files)
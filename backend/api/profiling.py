@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('api.profiling')
+
+current_profile = ContextVar('current_profile', default=None)
+
+# Управление транзакцией не входит в бюджет: на SQLite atomic() шлет
+# BEGIN, а TestCase оборачивает каждый atomic() в SAVEPOINT/RELEASE.
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+class QueryBudgetExceededError(Exception):
+    """Представление выполнило больше SQL-запросов, чем заявлено."""
+
+
+class RequestProfile:
+    """Число и время SQL-запросов, время сериализации одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+def profile_query(execute, sql, params, many, context):
+    """
+    Учитывает запрос в профиле текущего запроса. Профиль берется
+    из contextvar, поэтому учитываются и запросы из потоков
+    sync_to_async при работе под ASGI. Операторы управления
+    транзакцией учитываются только во времени БД.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if not sql.lstrip()[:9].upper().startswith(TRANSACTION_STATEMENTS):
+            profile.queries += 1
+        profile.db_time += perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_profiler(sender, connection, **kwargs):
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+@lru_cache(maxsize=None)
+def get_profiled_serializer_class(serializer_class):
+    """
+    Подкласс сериализатора, который учитывает время to_representation
+    в профиле текущего запроса.
+    """
+    def to_representation(self, instance):
+        started = perf_counter()
+        try:
+            return serializer_class.to_representation(self, instance)
+        finally:
+            profile = current_profile.get()
+            if profile is not None:
+                profile.serializer_time += perf_counter() - started
+
+    return type(serializer_class.__name__, (serializer_class,), {
+        '__module__': serializer_class.__module__,
+        'to_representation': to_representation,
+    })
+
+
+class QueryBudgetMixin:
+    """
+    Бюджет SQL-запросов представления: число или словарь
+    {действие: число}, например {'list': 6, 'retrieve': 5}.
+    Проверяется в QueryProfilingMiddleware.
+    """
+    query_budget = None
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = get_profiled_serializer_class(
+            self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+def get_query_budget(request):
+    match = getattr(request, 'resolver_match', None)
+    view = getattr(match.func, 'cls', None) if match else None
+    budget = getattr(view, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(match.func, 'actions', None) or {}
+        budget = budget.get(actions.get(request.method.lower()))
+    return match.view_name if match else None, budget
+
+
+class QueryProfilingMiddleware:
+    """
+    Считает SQL-запросы, время БД и сериализации, размер ответа,
+    отдает их в заголовке Server-Timing и в логе api.profiling.
+    Превышение бюджета представления пишется в лог как предупреждение,
+    а при QUERY_BUDGET_RAISE = True поднимает QueryBudgetExceededError.
+    Работает и в синхронной, и в асинхронной цепочке обработчиков.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.report(request, response, profile, started)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.report(request, response, profile, started)
+
+    @staticmethod
+    def report(request, response, profile, started):
+        total = perf_counter() - started
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={profile.db_time * 1000:.1f};'
+            f'desc="{profile.queries} queries"',
+            f'serializer;dur={profile.serializer_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        view_name, budget = get_query_budget(request)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': profile.queries,
+            'query_budget': budget,
+            'db_ms': round(profile.db_time * 1000, 1),
+            'serializer_ms': round(profile.serializer_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'size': None if response.streaming else len(response.content),
+        }
+        logger.info(json.dumps(record))
+
+        if budget is not None and profile.queries > budget:
+            message = (
+                f'{view_name}: {profile.queries} SQL-запросов '
+                f'при бюджете {budget} ({request.method} {request.path})'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceededError(message)
+            logger.warning(message)
+        return response
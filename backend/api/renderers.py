@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+    stream() отдает файл по частям, по мере чтения строк
+    агрегированного запроса, render() нужен DRF для ответов с ошибками.
+    """
+    charset = 'utf-8'
+    extension = None
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, rows):
+        for row in rows:
+            yield f"{row['name']} ({row['units']}) - {row['total']}\n"
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+    header = ('Ингредиент', 'Единица измерения', 'Количество')
+
+    def stream(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        for row in rows:
+            writer.writerow((row['name'], row['units'], row['total']))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class JSONShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    extension = 'json'
+
+    def stream(self, rows):
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps({
+                'name': row['name'],
+                'measurement_unit': row['units'],
+                'amount': row['total'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class PDFShoppingCartRenderer(ShoppingCartRenderer):
+    """
+    PDF не пишется построчно в сеть: reportlab собирает документ
+    целиком, поэтому файл отдается одним куском после сборки.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    extension = 'pdf'
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        """
+        Шрифт с кириллицей. Встроенные шрифты PDF (Helvetica) ее
+        не рисуют, поэтому без него выгрузка падает, а не отдает
+        пустые глифы.
+        """
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            try:
+                pdfmetrics.registerFont(
+                    TTFont(self.font_name, settings.SHOPPING_CART_PDF_FONT))
+            except (OSError, TTFError) as error:
+                raise ImproperlyConfigured(
+                    'Не удалось загрузить шрифт SHOPPING_CART_PDF_FONT '
+                    f'{settings.SHOPPING_CART_PDF_FONT}: {error}')
+        return self.font_name
+
+    def stream(self, rows):
+        # Шрифт проверяется до начала ответа, а не на первом куске.
+        return self.build(rows, self.get_font())
+
+    def build(self, rows, font):
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        line_height = self.font_size * 1.5
+        y = height - self.margin
+        document.setFont(font, self.font_size)
+        for row in rows:
+            if y < self.margin:
+                document.showPage()
+                document.setFont(font, self.font_size)
+                y = height - self.margin
+            document.drawString(
+                self.margin, y,
+                f"{row['name']} ({row['units']}) - {row['total']}")
+            y -= line_height
+        document.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_CART_RENDERERS = (
+    TextShoppingCartRenderer,
+    CSVShoppingCartRenderer,
+    JSONShoppingCartRenderer,
+    PDFShoppingCartRenderer,
+)
@@ -1,13 +1,17 @@
+from api.fields import ImageRenditionsField, StreamingImageField
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from recipes.memberships import get_memberships
 from recipes.models import (Ingredient, IngredientRecipe, Recipe, Shopping,
-                            Tag, TagRecipe)
+                            ShoppingCartLine, Tag, TagRecipe)
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 from rest_framework.generics import get_object_or_404
-from rest_framework.settings import api_settings
-from users.models import Follow, User
+from users.models import User
 
 User = get_user_model()
 
@@ -38,56 +42,16 @@ class UserSerializer(UserSerializer):
             'username',
             'first_name',
             'is_subscribed',
+            'recipes_count',
+            'followers_count',
         )
 
     def get_is_subscribed(self, obj):
         """
         Провоеряем подписанны пользователи.
         """
-        request = self.context.get('request')
-        if self.context.get('request').user.is_anonymous:
-            return False
-        return obj.following.filter(user=request.user).exists()
-
-
-class FollowShortRecipeSerializer(serializers.ModelSerializer):
-    """
-    Сериализатор для короткой модели рецепта
-    для избранных рецептов в подписках.
-    """
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-
-
-class FollowSerializer(serializers.ModelSerializer):
-    """
-    Сериализатор для вывода подписок у авторов.
-    """
-    recipes = FollowShortRecipeSerializer(many=True, read_only=True)
-    is_subscribed = SerializerMethodField(read_only=True)
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True)
-
-    class Meta:
-        model = Follow
-        fields = ('is_subscribed', 'recipes', 'recipes_count',)
-
-    def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if not user:
-            return False
-        return obj.following.filter(user=user, author=obj).exists()
-
-    def validate(self, data):
-        request = self.context['request']
-        author = self.initial_data['author']
-        if request.user == author:
-            raise serializers.ValidationError(
-                {'errors': 'Нельзя подписаться на себя.'})
-        if request.user.follower.filter(author=author).exists():
-            raise serializers.ValidationError({'errors': 'Есть подписка.'})
-        return data
+        memberships = get_memberships(self.context.get('request'))
+        return obj.pk in memberships.following
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -111,9 +75,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор ингредиентов и рецепта."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source='ingredient_id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit'
@@ -137,6 +99,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField(read_only=True)
     image = Base64ImageField(max_length=None)
+    srcset = ImageRenditionsField()
 
     class Meta:
         model = Recipe
@@ -149,25 +112,59 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'srcset',
             'text',
             'cooking_time',
+            'favorites_count',
         )
 
     def get_ingredients(self, obj):
-        ingredients = IngredientRecipe.objects.filter(recipe=obj)
+        prefetch_related_objects([obj], Prefetch(
+            'recipe_to_ingredient',
+            queryset=IngredientRecipe.objects.select_related('ingredient'),
+        ))
+        ingredients = obj.recipe_to_ingredient.all()
         return RecipeIngredientSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return obj.favorite.filter(user=user).exists()
+        memberships = get_memberships(self.context.get('request'))
+        return obj.pk in memberships.favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return obj.shopping_cart.filter(user=user).exists()
+        memberships = get_memberships(self.context.get('request'))
+        return obj.pk in memberships.cart
+
+
+class RecipeMatchSerializer(RecipeReadSerializer):
+    """Рецепт из подбора по ингредиентам: сколько из них уже есть."""
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'matched', 'missing', 'coverage',
+        )
+
+
+class IngredientIdsSerializer(serializers.Serializer):
+    """Параметры подбора: ?ids=1,2,3 и необязательный ?max_missing=."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+    def to_internal_value(self, data):
+        data = {
+            'ids': [
+                value for values in data.getlist('ids')
+                for value in values.split(',') if value.strip()
+            ],
+            **({'max_missing': data['max_missing']}
+               if 'max_missing' in data else {}),
+        }
+        return super().to_internal_value(data)
 
 
 class TagRecipeSerializer(serializers.ModelSerializer):
@@ -189,16 +186,17 @@ class TagRecipeSerializer(serializers.ModelSerializer):
 class RecipeAddSerializer(serializers.ModelSerializer):
     """
     Сериализатор для добавления рецептов.
+    Тэги и ингредиенты проверяются одним запросом на каждый список,
+    связи пишутся пачкой, поэтому число запросов не зависит
+    от количества ингредиентов.
     """
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
     )
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(many=True)
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField(max_length=None)
+    image = StreamingImageField(max_length=None)
 
     class Meta:
         model = Recipe
@@ -207,8 +205,6 @@ class RecipeAddSerializer(serializers.ModelSerializer):
             'tags',
             'author',
             'ingredients',
-            'is_favorited',
-            'is_in_shopping_cart',
             'name',
             'image',
             'text',
@@ -225,7 +221,7 @@ class RecipeAddSerializer(serializers.ModelSerializer):
     def validate_ingredients(self, ingredients):
         ingredient_ids = set()
         for ingredient in ingredients:
-            ingredient_id = ingredient['id']
+            ingredient_id = ingredient['ingredient_id']
             amount = ingredient['amount']
             if ingredient_id in ingredient_ids:
                 raise serializers.ValidationError(
@@ -236,12 +232,18 @@ class RecipeAddSerializer(serializers.ModelSerializer):
                     'Количество ингредиентов должно быть больше нуля.'
                 )
             ingredient_ids.add(ingredient_id)
+        if Ingredient.objects.filter(
+                id__in=ingredient_ids).count() != len(ingredient_ids):
+            raise serializers.ValidationError('Ингредиент отсутствует.')
         return ingredients
 
     def validate_tags(self, tags):
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError('Тег отсутствует.')
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError(
+                'Тэги должны быть уникальными.'
+            )
+        if Tag.objects.filter(id__in=tags).count() != len(tags):
+            raise serializers.ValidationError('Тег отсутствует.')
         return tags
 
     def validate(self, attrs):
@@ -251,6 +253,7 @@ class RecipeAddSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Отсутствуют ингредиенты.')
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request', None)
         ingredients_data = validated_data.pop('ingredients')
@@ -258,75 +261,80 @@ class RecipeAddSerializer(serializers.ModelSerializer):
 
         recipe = Recipe.objects.create(author=request.user, **validated_data)
         recipe.tags.set(tags)
-
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data['ingredient']
-            amount = ingredient_data['amount']
-            IngredientRecipe.objects.create(
-                recipe=recipe, ingredient=ingredient, amount=amount
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_data['ingredient_id'],
+                amount=ingredient_data['amount'],
             )
+            for ingredient_data in ingredients_data
+        )
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
 
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data['ingredient']
-            amount = ingredient_data['amount']
-            IngredientRecipe.objects.create(
-                recipe=instance, ingredient=ingredient, amount=amount
+        current = {
+            ingredient.ingredient_id: ingredient
+            for ingredient in instance.recipe_to_ingredient.all()
+        }
+        amounts = {
+            ingredient_data['ingredient_id']: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        old_amounts = {
+            ingredient_id: ingredient.amount
+            for ingredient_id, ingredient in current.items()
+        }
+        removed = [
+            ingredient.pk for ingredient_id, ingredient in current.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            ingredient = current.get(ingredient_id)
+            if ingredient is not None and ingredient.amount != amount:
+                ingredient.amount = amount
+                changed.append(ingredient)
+        if removed:
+            IngredientRecipe.objects.filter(pk__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount
             )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
 
         instance.tags.set(tags)
+        ShoppingCartLine.objects.change_recipe(instance, old_amounts, amounts)
 
         return super().update(instance, validated_data)
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorites.filter(user=request.user).exists()
-        return False
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.shopping_cart.filter(user=request.user).exists()
-        return False
-
     def to_representation(self, instance):
-        data = super().to_representation(instance)
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            data['is_favorited'] = self.get_is_favorited(instance)
-            data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(
-                instance)
-        else:
-            data['is_favorited'] = False
-            data['is_in_shopping_cart'] = False
-        return data
+        return RecipeReadSerializer(instance, context=self.context).data
 
 
 class ShortRecipeShoppingSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого отображения сведений о рецепте."""
+    srcset = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'name',
-                  'image', 'cooking_time')
+                  'image', 'srcset', 'cooking_time')
 
 
 class SubscribeSerializer(UserSerializer):
     """
     Сериализатор вывода авторов на которых подписан текущий пользователь.
     """
-    recipes = ShortRecipeShoppingSerializer(many=True, read_only=True)
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True)
-    is_subscribed = serializers.SerializerMethodField()
+    recipes = SerializerMethodField()
 
     class Meta:
         model = User
@@ -339,24 +347,68 @@ class SubscribeSerializer(UserSerializer):
             'is_subscribed',
             'recipes',
             'recipes_count',
+            'followers_count',
         )
         read_only_fields = ('email', 'username', 'first_name', 'last_name')
 
     def get_recipes(self, obj):
-        recipes_limit = int(self.context['request'].GET.get(
-            'recipes_limit', api_settings.PAGE_SIZE))
+        """
+        Рецепты автора берутся из контекста, куда их заранее
+        кладет представление одним запросом на всю страницу.
+        """
+        recipes = self.context.get('recipes')
+        if recipes is not None:
+            recipes = recipes.get(obj.pk, [])
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        return ShortRecipeShoppingSerializer(
+            recipes, many=True, context=self.context).data
 
-        user = get_object_or_404(User, pk=obj.pk)
-        recipes = Recipe.objects.filter(author=user)[:recipes_limit]
+    def get_is_subscribed(self, obj):
+        # В списке подписок текущего пользователя подписан на всех.
+        return True
 
-        return ShortRecipeShoppingSerializer(recipes, many=True).data
 
-    def get_is_subscribed(self, obj):
-        if not self.context['request'].user.is_authenticated:
-            return False
+class BulkSubscribeSerializer(serializers.Serializer):
+    """Авторы для массовой подписки и отписки."""
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.FOLLOW_BULK_LIMIT,
+    )
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """Рецепты для пакетного добавления в избранное или корзину."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_LIMIT,
+    )
+
+
+class ServingsSerializer(serializers.ModelSerializer):
+    """Число порций рецепта в корзине."""
+
+    class Meta:
+        model = Shopping
+        fields = ('servings',)
+        extra_kwargs = {'servings': {'default': 1}}
+
+
+class BulkCartSerializer(ServingsSerializer):
+    """Рецепты для пакетного добавления в корзину и число порций."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_LIMIT,
+    )
 
-        return Follow.objects.filter(
-            author=obj, user=self.context['request'].user).exists()
+    class Meta(ServingsSerializer.Meta):
+        fields = ('recipes', 'servings')
 
 
 class ShoppingSerializer(serializers.ModelSerializer):
@@ -364,7 +416,7 @@ class ShoppingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Shopping
-        fields = ('user', 'recipe',)
+        fields = ('user', 'recipe', 'servings')
 
     def validate(self, data):
         user = data['user']
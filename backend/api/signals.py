@@ -0,0 +1,34 @@
+from api.cache import bump_version, bump_version_on_commit
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.images import renditions_built
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagRecipe)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_cache(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients_cache(sender, **kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes_cache(sender, **kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver(renditions_built)
+def invalidate_recipes_cache_on_renditions(sender, **kwargs):
+    bump_version('recipes')
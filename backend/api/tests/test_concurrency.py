@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from django.db import connection
+from django.test import TransactionTestCase
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCartLine, TimelineEntry)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+
+class ConcurrentRecipeLinksTest(TransactionTestCase):
+    """
+    Параллельные добавления и удаления одного рецепта в избранное
+    и корзину и одной подписки: ровно один запрос меняет данные,
+    а счетчики, агрегат списка покупок и лента сходятся.
+    """
+
+    threads = 8
+
+    def setUp(self):
+        self.author = author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=10)
+        for i in range(3):
+            IngredientRecipe.objects.create(
+                recipe=self.recipe,
+                ingredient=Ingredient.objects.create(
+                    name=f'Ингредиент {i}', measurement_unit='г'),
+                amount=i + 1)
+
+    def send_in_parallel(self, method, path):
+        """Один и тот же запрос из нескольких потоков одновременно."""
+        barrier = Barrier(self.threads)
+
+        def send(_):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            try:
+                barrier.wait()
+                return getattr(client, method)(path).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            return sorted(pool.map(send, range(self.threads)))
+
+    def assert_one_succeeded(self, codes, success, failure=400):
+        self.assertEqual(codes.count(success), 1, codes)
+        self.assertEqual(set(codes) - {success}, {failure}, codes)
+
+    def assert_cart_lines_consistent(self):
+        self.assertEqual(
+            dict(ShoppingCartLine.objects.values_list(
+                'ingredient_id', 'total')),
+            {
+                ingredient_id: total
+                for (_, ingredient_id), total
+                in ShoppingCartLine.objects.get_live_totals().items()
+            },
+        )
+
+    def test_favorite(self):
+        path = f'/api/recipes/{self.recipe.pk}/favorite/'
+
+        self.assert_one_succeeded(self.send_in_parallel('post', path), 201)
+        self.recipe.refresh_from_db()
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+        self.assert_one_succeeded(self.send_in_parallel('delete', path), 204)
+        self.recipe.refresh_from_db()
+        self.assertEqual(Favorite.objects.count(), 0)
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_shopping_cart(self):
+        path = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+
+        self.assert_one_succeeded(self.send_in_parallel('post', path), 201)
+        self.assertEqual(self.user.shopping_cart.count(), 1)
+        self.assertEqual(ShoppingCartLine.objects.count(), 3)
+        self.assert_cart_lines_consistent()
+
+        self.assert_one_succeeded(self.send_in_parallel('delete', path), 204)
+        self.assertEqual(self.user.shopping_cart.count(), 0)
+        self.assertFalse(ShoppingCartLine.objects.exists())
+
+    def test_subscribe(self):
+        path = f'/api/users/{self.author.pk}/subscribe/'
+
+        # Повторная подписка не ошибка, поэтому все получают 200.
+        self.assertEqual(
+            set(self.send_in_parallel('post', path)), {200})
+        self.author.refresh_from_db()
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.user).count(), 1)
+
+        self.assert_one_succeeded(
+            self.send_in_parallel('delete', path), 200, 404)
+        self.author.refresh_from_db()
+        self.assertEqual(Follow.objects.count(), 0)
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertFalse(TimelineEntry.objects.exists())
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+# Запросов на страницу ленты рецептов при любом размере страницы:
+# COUNT, рецепты с авторами, теги, ингредиенты и для пользователя
+# еще токен и множества избранного, корзины и подписок.
+ANONYMOUS_LIST_QUERIES = 4
+AUTHENTICATED_LIST_QUERIES = 6
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов /api/recipes/ не зависит от размера страницы."""
+
+    page_sizes = (5, 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия')
+            for i in range(5)
+        ]
+        cls.user = authors[0]
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(20)
+        ]
+        for i in range(60):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                text='Описание', cooking_time=10)
+            recipe.tags.set(tags[:1 + i % len(tags)])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=ingredients[(i + j) % 20],
+                    amount=j + 1)
+                for j in range(4)
+            )
+            if i % 3 == 0:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if i % 4 == 0:
+                Shopping.objects.create(user=cls.user, recipe=recipe)
+        Follow.objects.create(user=cls.user, author=authors[1])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        # Анонимная лента кэшируется, а считать нужно запросы к базе.
+        cache.clear()
+
+    def assert_list_queries(self, client, expected):
+        for limit in self.page_sizes:
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(expected):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous_list(self):
+        self.assert_list_queries(APIClient(), ANONYMOUS_LIST_QUERIES)
+
+    def test_authenticated_list(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assert_list_queries(client, AUTHENTICATED_LIST_QUERIES)
@@ -0,0 +1,153 @@
+import base64
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from api.profiling import QueryBudgetExceededError
+from api.views import TagViewSet
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+
+class QueryBudgetTest(TestCase):
+    """Превышение бюджета запросов в тестах роняет запрос."""
+
+    path = '/api/tags/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+
+    def setUp(self):
+        # Справочник отдается из кэша без запросов к базе.
+        cache.clear()
+
+    def test_raises_by_default_in_tests(self):
+        self.assertTrue(settings.QUERY_BUDGET_RAISE)
+
+    def test_within_budget(self):
+        response = APIClient().get(self.path)
+        self.assertEqual(response.status_code, 200)
+
+    def test_over_budget_raises(self):
+        with mock.patch.object(TagViewSet, 'query_budget', 0):
+            with self.assertRaisesMessage(
+                QueryBudgetExceededError, 'при бюджете 0'
+            ):
+                APIClient().get(self.path)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_over_budget_warns_without_raise(self):
+        with mock.patch.object(TagViewSet, 'query_budget', 0):
+            with self.assertLogs('api.profiling', 'WARNING') as logs:
+                response = APIClient().get(self.path)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('при бюджете 0', logs.output[0])
+
+
+class WriteQueryBudgetTest(TestCase):
+    """
+    Записи укладываются в бюджет и под TestCase, где каждый
+    atomic() оборачивается в SAVEPOINT.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия')
+            for name in ('user', 'author')
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(3)
+        ]
+        cls.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10)
+            recipe.tags.set([cls.tag])
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=cls.ingredients[i], amount=100)
+            cls.recipes.append(recipe)
+        cls.token = Token.objects.create(user=cls.user)
+        cls.author_token = Token.objects.create(user=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def request(self, method, path, expected, data=None, client=None):
+        client = client or self.client
+        response = getattr(client, method)(path, data, format='json')
+        self.assertEqual(response.status_code, expected, response.content)
+
+    def recipe_data(self):
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(image, 'PNG')
+        return {
+            'image': 'data:image/png;base64,'
+            + base64.b64encode(image.getvalue()).decode(),
+            'name': 'Омлет', 'text': 'Взбить и пожарить', 'cooking_time': 5,
+            'tags': [self.tag.pk],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 50}
+                for ingredient in self.ingredients
+            ],
+        }
+
+    def test_favorite(self):
+        path = f'/api/recipes/{self.recipes[0].pk}/favorite/'
+        self.request('post', path, 201)
+        self.request('delete', path, 204)
+
+    def test_shopping_cart(self):
+        path = f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        self.request('post', path, 201, {'servings': 2})
+        self.request('patch', path, 200, {'servings': 3})
+        self.request('delete', path, 204)
+
+    def test_bulk(self):
+        recipes = [recipe.pk for recipe in self.recipes]
+        for path in ('/api/recipes/favorite/', '/api/recipes/shopping_cart/'):
+            with self.subTest(path=path):
+                self.request('post', path, 200, {'recipes': recipes})
+                self.request('delete', path, 200, {'recipes': recipes})
+
+    def test_subscribe(self):
+        path = f'/api/users/{self.author.pk}/subscribe/'
+        self.request('post', path, 200)
+        self.request('delete', path, 200)
+        path = '/api/users/subscribe/'
+        self.request('post', path, 200, {'authors': [self.author.pk]})
+        self.request('delete', path, 200, {'authors': [self.author.pk]})
+
+    def test_recipe_create_update_destroy(self):
+        author = APIClient()
+        author.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.author_token.key}')
+        self.request('post', '/api/recipes/', 201, self.recipe_data(), author)
+        path = f'/api/recipes/{self.recipes[0].pk}/'
+        self.request('put', path, 200, self.recipe_data(), author)
+        self.request(
+            'patch', path, 200, {**self.recipe_data(), 'cooking_time': 7},
+            author)
+        self.request('delete', path, 204, client=author)
@@ -1,8 +1,9 @@
-
+from api import async_views
 from api.views import (DownloadShoppingCartView, IngredientViewSet,
                        RecipeShoppingViewSet, RecipeViewSet, TagViewSet,
                        UserViewSet)
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 app_name = 'api'
@@ -24,3 +25,35 @@ urlpatterns = [
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.SERVER_MODE == 'asgi':
+    # Под ASGI чтение рецептов, тегов, ингредиентов и выгрузка корзины
+    # идут через асинхронные обертки, остальные маршруты не меняются.
+    # Рецепт ловится только по числовому id, чтобы пакетные
+    # recipes/favorite/ и recipes/shopping_cart/ доходили до роутера.
+    urlpatterns = [
+        path(
+            'recipes/download_shopping_cart/',
+            async_views.download_shopping_cart,
+            name='download_shopping_cart',
+        ),
+        re_path(r'^recipes/$', async_views.recipe_list, name='recipes-list'),
+        re_path(
+            r'^recipes/feed/$', async_views.recipe_feed, name='recipes-feed'),
+        re_path(
+            r'^recipes/by_ingredients/$', async_views.recipe_by_ingredients,
+            name='recipes-by-ingredients'),
+        re_path(
+            r'^recipes/(?P<pk>[0-9]+)/$',
+            async_views.recipe_detail, name='recipes-detail'),
+        re_path(r'^tags/$', async_views.tag_list, name='tags-list'),
+        re_path(
+            r'^tags/(?P<pk>[^/.]+)/$',
+            async_views.tag_detail, name='tags-detail'),
+        re_path(
+            r'^ingredients/$',
+            async_views.ingredient_list, name='ingredients-list'),
+        re_path(
+            r'^ingredients/(?P<pk>[^/.]+)/$',
+            async_views.ingredient_detail, name='ingredients-detail'),
+    ] + urlpatterns
@@ -1,18 +1,98 @@
-from django.db.models import F, Sum
+import hashlib
+from collections import defaultdict
 
+from django.db.models import (Case, Count, F, Max, Sum, Value, When,
+                              Window)
+from django.db.models.functions import RowNumber
+from recipes.models import Recipe
 
-def create_shopping_cart_report(items):
-    items = items.values(
-        'ingredient__name', 'ingredient__measurement_unit'
-    ).annotate(
+
+CHUNK_SIZE = 500
+
+# Единица: (к какой приводим, множитель).
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
+
+
+def get_unit_normalization(units_field):
+    """
+    Выражения для единицы и множителя: кг переводятся в г, л в мл,
+    чтобы один продукт в разных единицах попадал в одну строку.
+    """
+    units = Case(
+        *(When(**{units_field: unit}, then=Value(base_unit))
+          for unit, (base_unit, _) in UNIT_CONVERSIONS.items()),
+        default=F(units_field),
+    )
+    factor = Case(
+        *(When(**{units_field: unit}, then=Value(factor))
+          for unit, (_, factor) in UNIT_CONVERSIONS.items()),
+        default=Value(1),
+    )
+    return units, factor
+
+
+def get_shopping_cart_rows(items, amount=F('amount')):
+    """
+    Суммарное количество каждого ингредиента из списка покупок
+    одним запросом, с группировкой по приведенной единице.
+    """
+    units, factor = get_unit_normalization('ingredient__measurement_unit')
+    return items.values(
         name=F('ingredient__name'),
-        units=F('ingredient__measurement_unit'),
-        total=Sum('amount'),
-    ).order_by('-total')
+        units=units,
+    ).annotate(
+        total=Sum(amount * factor),
+    ).order_by('-total', 'name')
+
+
+def get_shopping_cart_line_rows(lines):
+    """
+    То же из готового агрегата ShoppingCartLine:
+    одно чтение строк пользователя по индексу (user, ingredient).
+    """
+    return get_shopping_cart_rows(lines, F('total'))
+
+
+def get_shopping_cart_etag(lines):
+    """
+    ETag списка покупок по отпечатку строк агрегата: число строк
+    и время последнего изменения одним запросом без группировки.
+    apply_deltas обновляет updated у каждой измененной строки,
+    а переименование ингредиента - у всех его строк.
+    """
+    fingerprint = lines.order_by().aggregate(
+        count=Count('id'), updated=Max('updated'))
+    return hashlib.md5(
+        repr(sorted(fingerprint.items())).encode()
+    ).hexdigest()
+
 
-    text = '\n'.join([
-        f"{item['name']} ({item['units']}) - {item['total']}"
-        for item in items
-    ])
+def get_latest_recipes(author_ids, limit=None):
+    """
+    Последние рецепты каждого автора одним запросом:
+    ROW_NUMBER() OVER (PARTITION BY author_id ORDER BY pub_date DESC).
+    Возвращает словарь {author_id: [рецепты]}.
+    """
+    recipes = defaultdict(list)
+    if not author_ids:
+        return recipes
+    ranked = Recipe.objects.filter(author_id__in=author_ids).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('pub_date').desc(),
+        )
+    ).order_by()
+    sql, params = ranked.query.sql_with_params()
+    query = f'SELECT * FROM ({sql}) ranked'
+    if limit is not None:
+        query += ' WHERE ranked.row_number <= %s'
+        params = (*params, limit)
+    query += ' ORDER BY ranked.author_id, ranked.row_number'
 
-    return text
+    for recipe in Recipe.objects.raw(query, params):
+        recipes[recipe.author_id].append(recipe)
+    return recipes
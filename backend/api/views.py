@@ -1,72 +1,260 @@
-from api.filters import IngredientFilter, RecipeFilter
+from api.cache import AnonymousFeedCacheMixin, CachedCatalogMixin
+from api.filters import (RECIPE_ORDERING_FIELDS, IngredientFilter,
+                         RecipeFilter)
 from api.pagination import LimitPageNumberPagination
+from api.parsers import MultiPartJSONParser
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrAdminOrReadOnly
-from api.serializers import (IngredientSerializer, RecipeAddSerializer,
-                             RecipeReadSerializer,
-                             ShortRecipeShoppingSerializer,
-                             FollowSerializer, TagSerializer,
+from api.profiling import QueryBudgetMixin
+from api.renderers import SHOPPING_CART_RENDERERS
+from api.serializers import (BulkCartSerializer, BulkRecipesSerializer,
+                             BulkSubscribeSerializer, IngredientIdsSerializer,
+                             IngredientSerializer, RecipeAddSerializer,
+                             RecipeMatchSerializer, RecipeReadSerializer,
+                             ServingsSerializer, ShortRecipeShoppingSerializer,
+                             SubscribeSerializer, TagSerializer,
                              UserCreateSerializer, UserSerializer)
-from api.utils import create_shopping_cart_report
+from api.utils import (CHUNK_SIZE, get_latest_recipes,
+                       get_shopping_cart_etag, get_shopping_cart_line_rows,
+                       get_shopping_cart_rows)
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db.models import F, Prefetch
+from django.http import HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from recipes.autocomplete import ingredient_index
+from recipes.bulk import (REMOVED, add_recipe, add_recipes, remove_recipe,
+                          remove_recipes, set_servings)
+from recipes.follows import follow, unfollow
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            Shopping, Tag)
+                            Shopping, ShoppingCartLine, Tag)
+from recipes.pantry import recipe_ingredient_index
 from rest_framework import status, views, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.views import Response
 from rest_framework.viewsets import ModelViewSet
-from users.models import Follow, User
+from users.models import User
 
 User = get_user_model()
 
 
-class TagViewSet(ModelViewSet):
+def get_recipe_queryset():
+    """
+    Рецепты со всеми связями для RecipeReadSerializer:
+    автор, тэги и ингредиенты подгружаются заранее, а флаги
+    текущего пользователя берутся из его множеств
+    (recipes.memberships), поэтому страница стоит
+    фиксированное число запросов.
+    """
+    return Recipe.objects.select_related('author').defer(
+        'search_vector',
+    ).prefetch_related(
+        'tags',
+        Prefetch(
+            'recipe_to_ingredient',
+            queryset=IngredientRecipe.objects.select_related('ingredient'),
+        ),
+    )
+
+
+def get_bulk_response(statuses):
+    """Ответ пакетной операции: статус по каждому id в порядке запроса."""
+    return Response({'results': [
+        {'id': pk, 'status': item_status}
+        for pk, item_status in statuses.items()
+    ]})
+
+
+class TagViewSet(QueryBudgetMixin, CachedCatalogMixin, ModelViewSet):
     """Вывод тегов."""
+    query_budget = 2
+    cache_namespace = 'tags'
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Tag.objects.all()
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(QueryBudgetMixin, CachedCatalogMixin, viewsets.ModelViewSet):
     """Вывод ингредиентов."""
+    query_budget = 2
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    permission_classes = (IsAuthorOrAdminOrReadOnly,)
+    permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     search_fields = ('^name',)
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """
+        Список и поиск по ?name= строятся по индексу в памяти,
+        без запросов к базе, и кэшируются как остальной справочник.
+        """
+        return self.get_cached_response(request, self.list_from_index)
+
+    def list_from_index(self, request):
+        name = request.query_params.get('name')
+        if name is None:
+            return Response(ingredient_index.all())
+        return Response(ingredient_index.search(name))
 
-class RecipeViewSet(ModelViewSet):
+
+class RecipeViewSet(QueryBudgetMixin, AnonymousFeedCacheMixin, ModelViewSet):
     """Вывод рецептов."""
+    query_budget = {
+        'list': 7, 'retrieve': 6, 'feed': 7, 'by_ingredients': 6,
+        'favorite_bulk': 4, 'shopping_cart_bulk': 6, 'create': 16,
+        'update': 24, 'partial_update': 24, 'destroy': 21,
+    }
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
+    parser_classes = (JSONParser, MultiPartJSONParser)
     pagination_class = LimitPageNumberPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def cursor_fields(self):
+        """
+        Поля курсора повторяют сортировку выдачи: ?ordering= (с добором
+        по -id, как в StableOrderingFilter), ранг поиска или дату.
+        """
+        if self.action == 'feed':
+            return ('-feed_date', '-id')
+        ordering = [
+            field for field in self.request.query_params.get(
+                'ordering', '').split(',')
+            if field.lstrip('-') in RECIPE_ORDERING_FIELDS
+        ]
+        if ordering:
+            return (*ordering, '-id')
+        if self.request.query_params.get('search', '').strip():
+            return ('-rank', '-id')
+        return ('-pub_date', '-id')
+
+    def get_queryset(self):
+        return get_recipe_queryset()
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipeAddSerializer
 
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        """
+        Рецепты авторов из подписок. Читаются из ленты пользователя,
+        заполненной при публикации, диапазоном по индексу
+        (user, -pub_date).
+        """
+        recipes = self.get_queryset().filter(
+            timeline_entries__user=request.user
+        ).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+        ).order_by('-feed_date', '-id')
+        page = self.paginate_queryset(recipes)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'])
+    def by_ingredients(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов (?ids=1,2,3):
+        рецепты с большей долей имеющихся ингредиентов выше,
+        при равной доле - с меньшим числом недостающих.
+        Подбор идет по индексу в памяти, из базы читается
+        только страница рецептов.
+        """
+        params = IngredientIdsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        matches = recipe_ingredient_index.match(
+            params.validated_data['ids'],
+            params.validated_data.get('max_missing'),
+        )
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        found = []
+        for recipe_id, matched, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched = matched
+            recipe.missing = total - matched
+            recipe.coverage = round(matched / total, 3)
+            found.append(recipe)
+        serializer = RecipeMatchSerializer(
+            found, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request):
+        """Избранное сразу для нескольких рецептов: {'recipes': [id]}."""
+        return self.change_bulk(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request):
+        """
+        Корзина сразу для нескольких рецептов:
+        {'recipes': [id], 'servings': порций}.
+        """
+        serializer = BulkCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return get_bulk_response(add_recipes(
+                Shopping, request.user, recipes,
+                serializer.validated_data['servings']))
+        return get_bulk_response(
+            remove_recipes(Shopping, request.user, recipes))
+
+    def change_bulk(self, model, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return get_bulk_response(add_recipes(model, request.user, recipes))
+        return get_bulk_response(
+            remove_recipes(model, request.user, recipes))
+
 
-class RecipeShoppingViewSet(ModelViewSet):
+class RecipeShoppingViewSet(QueryBudgetMixin, ModelViewSet):
     """
     Вывод наличия рецептов в корзине.
     """
+    query_budget = {'favorite': 4, 'shopping_cart': 6}
     queryset = Recipe.objects.all()
+    lookup_value_regex = '[0-9]+'
     permission_classes = (IsAuthorOrAdminOrReadOnly, IsAdminOrReadOnly,)
     pagination_class = LimitPageNumberPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return get_recipe_queryset()
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -83,64 +271,104 @@ class RecipeShoppingViewSet(ModelViewSet):
     def favorite(self, request, pk):
         if request.method == 'POST':
             return self.add_to(Favorite, request.user, pk)
+        return self.delete_from(Favorite, request.user, pk)
 
     @action(
         detail=True,
-        methods=['post', 'delete'],
+        methods=['post', 'patch', 'delete'],
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk):
+        """
+        Рецепт в корзине. POST и PATCH принимают {'servings': порций},
+        на это число умножаются ингредиенты рецепта в списке покупок.
+        """
+        if request.method == 'DELETE':
+            return self.delete_from(Shopping, request.user, pk)
+        serializer = ServingsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        servings = serializer.validated_data['servings']
         if request.method == 'POST':
-            return self.add_to(Shopping, request.user, pk)
+            return self.add_to(Shopping, request.user, pk, servings)
+        if not set_servings(request.user, int(pk), servings):
+            return Response({'errors': 'Рецепта нет в корзине!'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.data)
 
-    def add_to(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+    def add_to(self, model, user, pk, servings=1):
+        recipe = get_object_or_404(Recipe, id=pk)
+        if not add_recipe(model, user, recipe.pk, servings):
             return Response({'errors': 'Рецепт уже добавлен!'},
                             status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
         serializer = ShortRecipeShoppingSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_from(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        if remove_recipe(model, user, int(pk)):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт уже удален!'},
                         status=status.HTTP_400_BAD_REQUEST)
 
 
-class DownloadShoppingCartView(views.APIView):
+class DownloadShoppingCartView(QueryBudgetMixin, views.APIView):
+    """
+    Выгрузка списка покупок в txt, csv, json или pdf (?format=).
+    Строки потоково читаются из агрегированного запроса. ETag
+    пользователя считается по отпечатку агрегата ShoppingCartLine,
+    поэтому повторная выгрузка без изменений отдает 304, не читая
+    сам список. У корзины из сессии версии нет, она отдается без ETag.
+    """
+    query_budget = 2
+    renderer_classes = SHOPPING_CART_RENDERERS
+
     def get(self, request):
-        items = IngredientRecipe.objects.select_related(
-            'recipe', 'ingredient'
-        )
+        renderer = request.accepted_renderer
+        etag = None
         if request.user.is_authenticated:
-            items = items.filter(
-                recipe__shopping_cart__user=request.user
-            )
+            lines = ShoppingCartLine.objects.filter(user=request.user)
+            etag = quote_etag(
+                f'{get_shopping_cart_etag(lines)}-{renderer.format}')
+            if etag in parse_etags(
+                request.META.get('HTTP_IF_NONE_MATCH', '')
+            ):
+                return HttpResponseNotModified(headers={'ETag': etag})
+            rows = get_shopping_cart_line_rows(lines)
         else:
-            items = items.filter(
-                recipe_id__in=request.session['purchases']
-            )
-
-        text = create_shopping_cart_report(items)
+            rows = get_shopping_cart_rows(IngredientRecipe.objects.filter(
+                recipe_id__in=request.session.get('purchases', [])
+            ))
 
-        filename = "foodgram_shopping_cart.txt"
-        response = HttpResponse(text, content_type='text/plain')
+        filename = f'foodgram_shopping_cart.{renderer.extension}'
+        response = StreamingHttpResponse(
+            renderer.stream(rows.iterator(chunk_size=CHUNK_SIZE)),
+            content_type=renderer.content_type,
+        )
         response['Content-Disposition'] = f'attachment; filename={filename}'
+        if etag is not None:
+            response['ETag'] = etag
 
         return response
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(QueryBudgetMixin, UserViewSet):
     """Вывод пользователей."""
+    query_budget = {
+        'list': 5, 'me': 3, 'retrieve': 4, 'subscribe': 7,
+        'subscribe_bulk': 6, 'subscriptions': 4,
+    }
     serializer_class = UserSerializer
     queryset = User.objects.all()
     pagination_class = LimitPageNumberPagination
 
+    @property
+    def cursor_fields(self):
+        if self.action == 'subscriptions':
+            return ('-subscribed', '-subscription_id')
+        return ('-id',)
+
     def get_serializer_class(self):
+        if self.action == 'subscriptions':
+            return SubscribeSerializer
         if self.request.method.lower() == 'post':
             return UserCreateSerializer
         return UserSerializer
@@ -154,32 +382,64 @@ class UserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def subscribe(self, request, id):
-        user = self.get_object()
+        author = self.get_object()
         current_user = request.user
 
         if request.method == 'POST':
             # Добавление подписки
-            if current_user == user:
+            if current_user == author:
                 return Response({'errors': 'Вы не можете подписаться на самого себя.'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            Follow.objects.get_or_create(user=user, author=current_user)
+            follow(current_user, [author.pk])
             return Response(status=status.HTTP_200_OK)
 
         if request.method == 'DELETE':
             # Удаление подписки
-            follow = get_object_or_404(Follow, user=user, author=current_user)
-            follow.delete()
+            if unfollow(current_user, [author.pk])[author.pk] != REMOVED:
+                raise NotFound('Вы не подписаны на этого автора.')
             return Response(status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='subscribe',
+        url_name='subscribe-bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def subscribe_bulk(self, request):
+        """Подписка и отписка сразу на несколько авторов: {'authors': [id]}."""
+        serializer = BulkSubscribeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        authors = serializer.validated_data['authors']
+        if request.method == 'POST':
+            return get_bulk_response(follow(request.user, authors))
+        return get_bulk_response(unfollow(request.user, authors))
+
     @action(detail=False,
             methods=['GET'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        follows = User.objects.filter(following__user=user)
+        follows = User.objects.filter(following__user=user).annotate(
+            subscribed=F('following__created'),
+            subscription_id=F('following__id'),
+        ).order_by('-subscribed', '-subscription_id')
         page = self.paginate_queryset(follows)
-        serializer = FollowSerializer(
+        recipes_limit = self.get_recipes_limit(request)
+        serializer = self.get_serializer(
             page, many=True,
-            context={'request': request})
-        return self.get_paginated_response(serializer.data)
\ No newline at end of file
+            context={
+                **self.get_serializer_context(),
+                'recipes_limit': recipes_limit,
+                'recipes': get_latest_recipes(
+                    [author.pk for author in page], recipes_limit),
+            })
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_recipes_limit(request):
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is None or not recipes_limit.isdigit():
+            return None
+        return int(recipes_limit)
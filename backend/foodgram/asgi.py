@@ -1,7 +1,19 @@
 import os
 
+from asgiref.sync import ThreadSensitiveContext
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """
+    Django 3.2 выполняет синхронный код представлений под ASGI
+    в одном общем потоке процесса. Свой контекст на каждый запрос
+    дает ему отдельный поток, как в Django 4.0+, и запросы
+    не выстраиваются в очередь друг за другом.
+    """
+    async with ThreadSensitiveContext():
+        return await django_application(scope, receive, send)
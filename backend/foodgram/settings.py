@@ -1,4 +1,5 @@
 import os
+import sys
 
 from django.utils.translation import gettext_lazy as _
 from dotenv import load_dotenv
@@ -33,7 +34,12 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
 ]
 
+# wsgi - синхронные воркеры gunicorn, asgi - воркеры uvicorn
+# с асинхронными представлениями для чтения (см. api/async_views.py).
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
 MIDDLEWARE = [
+    'api.profiling.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +74,10 @@ if DEBUG:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'OPTIONS': {'timeout': 20},
+            # Тестовая база в файле, а не в памяти: тесты гонок
+            # обращаются к ней из нескольких потоков.
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
         }
     }
 else:
@@ -82,6 +92,34 @@ else:
         }
     }
 
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Версии справочников общие для воркеров только в Redis: в LocMemCache
+# смену версии видит один воркер, поэтому ответы живут несколько секунд.
+CATALOG_CACHE_TIMEOUT = int(os.getenv(
+    'CATALOG_CACHE_TIMEOUT', 60 * 60 if os.getenv('REDIS_URL') else 5))
+RECIPE_FEED_CACHE_TIMEOUT = int(os.getenv('RECIPE_FEED_CACHE_TIMEOUT', 60))
+RECIPE_FEED_STALE_TIMEOUT = int(os.getenv('RECIPE_FEED_STALE_TIMEOUT', 10 * 60))
+RECIPE_FEED_LOCK_TIMEOUT = 5
+# Множества избранного, корзины и подписок живут между запросами только
+# в общем кэше (Redis): сброс в LocMemCache дошел бы до одного воркера.
+MEMBERSHIP_CACHE_TIMEOUT = int(os.getenv(
+    'MEMBERSHIP_CACHE_TIMEOUT', 60 * 60 if os.getenv('REDIS_URL') else 0))
+FOLLOW_BULK_LIMIT = int(os.getenv('FOLLOW_BULK_LIMIT', 100))
+RECIPE_BULK_LIMIT = int(os.getenv('RECIPE_BULK_LIMIT', 100))
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -140,3 +178,50 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 EMPTY_VALUE = _('-пусто-')
+
+# Шрифт с кириллицей лежит в репозитории (DejaVu, см. fonts/LICENSE_DEJAVU).
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    os.path.join(BASE_DIR, 'fonts', 'DejaVuSans.ttf')
+)
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+RECIPE_SEARCH_LIMIT = int(os.getenv('RECIPE_SEARCH_LIMIT', 500))
+RECIPE_SEARCH_INDEX_TTL = int(os.getenv('RECIPE_SEARCH_INDEX_TTL', 300))
+
+RECIPE_MATCH_LIMIT = int(os.getenv('RECIPE_MATCH_LIMIT', 500))
+RECIPE_MATCH_INDEX_TTL = int(os.getenv('RECIPE_MATCH_INDEX_TTL', 300))
+
+# Уменьшенные копии изображений рецептов (recipes/images.py).
+RECIPE_IMAGE_DIR = 'recipes/renditions'
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_SYNC = os.getenv('RECIPE_IMAGE_SYNC', 'False') == 'True'
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+
+# В тестах (manage.py test) превышение бюджета SQL-запросов - ошибка.
+TESTING = sys.argv[1:2] == ['test']
+QUERY_BUDGET_RAISE = os.getenv(
+    'QUERY_BUDGET_RAISE', str(TESTING)) == 'True'
+
+# Запись на каждый запрос в api.profiling - уровень INFO
+# (PROFILING_LOG_LEVEL=INFO), по умолчанию только превышения бюджета.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {
+            'handlers': ['console'],
+            'level': os.getenv('PROFILING_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
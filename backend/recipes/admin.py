@@ -1,8 +1,11 @@
 from django.conf import settings
 from django.contrib import admin
 from django.contrib.admin import ModelAdmin, TabularInline
+from django.db.models import Prefetch
+from recipes.admin_filters import AutocompleteFilterMixin, autocomplete_filter
+from recipes.counters import change_counter
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            Shopping, Tag)
+                            Shopping, ShoppingCartLine, Tag)
 
 
 @admin.register(Tag)
@@ -17,25 +20,49 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientAdmin(ModelAdmin):
     list_display = ('name', 'measurement_unit',)
     search_fields = ('name', 'measurement_unit',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    show_full_result_count = False
     empty_value = settings.EMPTY_VALUE
 
 
 class IngredientRecipeInline(TabularInline):
     model = IngredientRecipe
+    raw_id_fields = ('ingredient',)
     min_num = 1
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+
 
 @admin.register(Recipe)
-class RecipeAdmin(ModelAdmin):
+class RecipeAdmin(AutocompleteFilterMixin, ModelAdmin):
     list_display = ('author', 'name', 'cooking_time',
-                    'get_tags', 'get_ingredients', 'favorite')
-    search_fields = ('name', 'author', 'tags')
-    list_filter = ('pub_date', 'author', 'name', 'tags')
+                    'get_tags', 'get_ingredients', 'favorites_count')
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username', 'author__email')
+    list_filter = ('pub_date', autocomplete_filter('author'),
+                   'tags')
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     inlines = (IngredientRecipeInline,)
     empty_value = settings.EMPTY_VALUE
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.only('name')),
+            Prefetch('ingredients', queryset=Ingredient.objects.only('name')),
+        )
+
+    def save_related(self, request, form, formsets, change):
+        """Изменение состава в инлайне переносится в списки покупок."""
+        recipe = form.instance
+        old_amounts = ShoppingCartLine.objects.get_recipe_amounts([recipe.pk])
+        super().save_related(request, form, formsets, change)
+        ShoppingCartLine.objects.change_recipe(
+            recipe, old_amounts,
+            ShoppingCartLine.objects.get_recipe_amounts([recipe.pk]))
+
     def get_ingredients(self, obj):
         return ', '.join([
             ingredients.name for ingredients
@@ -43,26 +70,70 @@ class RecipeAdmin(ModelAdmin):
 
     get_ingredients.short_description = 'Ингридиенты'
 
-    def favorite(self, obj):
-        return obj.favorite.count()
-    favorite.short_description = 'Избранное'
-
     def get_tags(self, obj):
         list_ = [_.name for _ in obj.tags.all()]
         return ', '.join(list_)
 
+    get_tags.short_description = 'Теги'
+
 
 @admin.register(Shopping)
-class ShoppingAdmin(ModelAdmin):
-    list_display = ('user', 'recipe',)
+class ShoppingAdmin(AutocompleteFilterMixin, ModelAdmin):
+    list_display = ('user', 'recipe', 'servings')
+    list_select_related = ('user', 'recipe')
+    list_filter = (autocomplete_filter('user'),
+                   autocomplete_filter('recipe'))
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     empty_value = settings.EMPTY_VALUE
 
+    # Корзина из админки меняет агрегат списка покупок так же, как API.
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = Shopping.objects.select_related('user', 'recipe').get(
+                pk=obj.pk)
+            ShoppingCartLine.objects.remove_recipe(
+                old.user, old.recipe, old.servings)
+        super().save_model(request, obj, form, change)
+        ShoppingCartLine.objects.add_recipe(obj.user, obj.recipe, obj.servings)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ShoppingCartLine.objects.remove_recipe(
+            obj.user, obj.recipe, obj.servings)
+
+    def delete_queryset(self, request, queryset):
+        carts = list(queryset.select_related('user', 'recipe'))
+        super().delete_queryset(request, queryset)
+        for cart in carts:
+            ShoppingCartLine.objects.remove_recipe(
+                cart.user, cart.recipe, cart.servings)
+
 
 @admin.register(Favorite)
-class FavoriteAdmin(ModelAdmin):
-    list_display = ('user', 'get_recipe',)
+class FavoriteAdmin(AutocompleteFilterMixin, ModelAdmin):
+    list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    list_filter = (autocomplete_filter('user'),
+                   autocomplete_filter('recipe'))
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
     empty_value = settings.EMPTY_VALUE
 
-    def get_recipe(self, obj):
-        return [
-            f'{item["name"]} ' for item in obj.recipe.values('name')[:10]]
+    # Избранное из админки меняет счетчик рецепта так же, как API.
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = Favorite.objects.get(pk=obj.pk)
+            change_counter(Recipe, old.recipe_id, 'favorites_count', -1)
+        super().save_model(request, obj, form, change)
+        change_counter(Recipe, obj.recipe_id, 'favorites_count', 1)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        change_counter(Recipe, obj.recipe_id, 'favorites_count', -1)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for recipe_id in recipe_ids:
+            change_counter(Recipe, recipe_id, 'favorites_count', -1)
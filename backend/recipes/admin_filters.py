@@ -0,0 +1,73 @@
+from django import forms
+from django.contrib.admin import SimpleListFilter
+from django.contrib.admin.widgets import AutocompleteSelect
+
+
+class AutocompleteFilter(SimpleListFilter):
+    """
+    Фильтр по внешнему ключу с полем автодополнения вместо списка.
+    RelatedFieldListFilter выводит в боковую панель все связанные
+    объекты, здесь же варианты подгружаются через autocomplete
+    админки, а из базы читается только выбранный объект.
+    Для связанной модели в админке должны быть заданы search_fields.
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        field = model._meta.get_field(self.field_name)
+        remote_model = field.remote_field.model
+        self.parameter_name = (
+            f'{self.field_name}__{remote_model._meta.pk.attname}__exact')
+        if self.title is None:
+            self.title = field.verbose_name
+        super().__init__(request, params, model, model_admin)
+        self.form_field = forms.ModelChoiceField(
+            queryset=remote_model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+
+    @classmethod
+    def get_media(cls, model_admin):
+        field = model_admin.model._meta.get_field(cls.field_name)
+        return AutocompleteSelect(field, model_admin.admin_site).media + (
+            forms.Media(js=('admin/js/autocomplete_filter.js',)))
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def rendered_widget(self):
+        return self.form_field.widget.render(
+            self.parameter_name, self.value(),
+            attrs={'id': f'id_filter_{self.parameter_name}',
+                   'style': 'width: 100%'})
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class AutocompleteFilterMixin:
+    """Подключает к списку объектов статику фильтров автодополнения."""
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if (isinstance(list_filter, type)
+                    and issubclass(list_filter, AutocompleteFilter)):
+                media += list_filter.get_media(self)
+        return media
+
+
+def autocomplete_filter(field_name, title=None):
+    """Класс фильтра автодополнения для поля field_name."""
+    return type(
+        f'{field_name.title()}AutocompleteFilter', (AutocompleteFilter,),
+        {'field_name': field_name, 'title': title},
+    )
@@ -0,0 +1,102 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from recipes.models import Ingredient
+
+
+def get_trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Совпадения по началу названия идут раньше совпадений по подстроке,
+    подстроки длиннее двух символов ищутся по триграммам.
+    Сбрасывается сигналами Ingredient и по истечении
+    INGREDIENT_INDEX_TTL на случай изменений из других процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        self._state = None
+
+    def _build(self):
+        ingredients = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda ingredient: (
+                ingredient['name'].lower(), ingredient['id'])
+        )
+        names = [ingredient['name'].lower() for ingredient in ingredients]
+        trigrams = {}
+        for position, name in enumerate(names):
+            for trigram in get_trigrams(name):
+                trigrams.setdefault(trigram, []).append(position)
+        return {
+            'built': time.monotonic(),
+            'ingredients': ingredients,
+            'names': names,
+            'trigrams': trigrams,
+        }
+
+    @staticmethod
+    def _is_fresh(state):
+        return state is not None and (
+            time.monotonic() - state['built'] < settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _get_state(self):
+        state = self._state
+        if not self._is_fresh(state):
+            with self._lock:
+                state = self._state
+                if not self._is_fresh(state):
+                    state = self._state = self._build()
+        return state
+
+    def all(self):
+        return self._get_state()['ingredients']
+
+    def search(self, query, limit=None):
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        state = self._get_state()
+        ingredients, names = state['ingredients'], state['names']
+        query = query.strip().lower()
+        if not query:
+            return ingredients[:limit]
+
+        start = position = bisect_left(names, query)
+        while (
+            position < len(names) and position - start < limit
+            and names[position].startswith(query)
+        ):
+            position += 1
+        found = ingredients[start:position]
+        if len(found) >= limit:
+            return found
+
+        if len(query) < 3:
+            candidates = range(len(names))
+        else:
+            postings = sorted(
+                (state['trigrams'].get(trigram, ())
+                 for trigram in get_trigrams(query)),
+                key=len
+            )
+            candidates = sorted(set(postings[0]).intersection(*postings[1:]))
+        for candidate in candidates:
+            name = names[candidate]
+            if query in name and not name.startswith(query):
+                found.append(ingredients[candidate])
+                if len(found) >= limit:
+                    break
+        return found
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,181 @@
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from recipes.counters import change_counters
+from recipes.memberships import invalidate_memberships
+from recipes.models import Favorite, Recipe, Shopping, ShoppingCartLine
+
+# Статусы элементов в ответе пакетных операций.
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+# Множество пользователя, которое меняет связь с рецептом.
+RECIPE_MEMBERSHIPS = {Favorite: 'favorites', Shopping: 'cart'}
+
+
+def get_add_statuses(ids, found, added):
+    """{id: статус} в порядке запроса; found - {id: связь уже была}."""
+    return {
+        pk: ADDED if pk in added else EXISTS if pk in found else NOT_FOUND
+        for pk in ids
+    }
+
+
+def get_remove_statuses(ids, removed):
+    return {pk: REMOVED if pk in removed else ABSENT for pk in ids}
+
+
+def apply_recipe_changes(model, user, recipes, sign):
+    """
+    То, что при одиночном добавлении делают представление и сигналы:
+    счетчик избранного, агрегат списка покупок и кэш множеств.
+    recipes - {recipe_id: порций} добавленных или удаленных связей.
+    """
+    if model is Favorite:
+        change_counters(Recipe, recipes, 'favorites_count', sign)
+    if model is Shopping:
+        amounts = ShoppingCartLine.objects.get_recipe_amounts(
+            recipes, recipes)
+        ShoppingCartLine.objects.apply_deltas([user.pk], {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in amounts.items()
+        })
+    invalidate_memberships(RECIPE_MEMBERSHIPS[model], [user.pk])
+
+
+def get_link_columns(model):
+    """Таблица связи, ее столбцы user и recipe и число порций."""
+    quote_name = connection.ops.quote_name
+    return (
+        quote_name(model._meta.db_table),
+        quote_name(model._meta.get_field('user').column),
+        quote_name(model._meta.get_field('recipe').column),
+        # У избранного порций нет, в RETURNING вместо них 1.
+        quote_name(model._meta.get_field('servings').column)
+        if model is Shopping else '1',
+    )
+
+
+def insert_recipe_links(model, user, recipe_ids, servings=1):
+    """
+    Одним INSERT ... ON CONFLICT DO NOTHING RETURNING связывает user
+    с существующими рецептами и возвращает {recipe_id: порций} тех,
+    что вставил именно этот запрос. Параллельная вставка той же связи
+    не бросает IntegrityError, а просто не попадает в результат.
+    RETURNING есть в PostgreSQL и в SQLite начиная с 3.35.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return {}
+    table, user_column, recipe_column, servings_column = (
+        get_link_columns(model))
+    recipes = Recipe._meta
+    recipe_pk = connection.ops.quote_name(recipes.pk.column)
+    columns, values, params = (
+        [user_column, recipe_column], ['%s', recipe_pk], [user.pk])
+    if model is Shopping:
+        columns.append(servings_column)
+        values.append('%s')
+        params.append(servings)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'SELECT {", ".join(values)} '
+            f'FROM {connection.ops.quote_name(recipes.db_table)} '
+            f'WHERE {recipe_pk} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {recipe_column}, {servings_column}',
+            [*params, *recipe_ids],
+        )
+        return dict(cursor.fetchall())
+
+
+def delete_recipe_links(model, user, recipe_ids):
+    """
+    Одним DELETE ... RETURNING удаляет связи и возвращает
+    {recipe_id: порций} тех, что удалил именно этот запрос:
+    параллельное удаление тех же строк вернет пустой результат.
+    Сигналы удаления не срабатывают, их работу делает
+    apply_recipe_changes.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return {}
+    table, user_column, recipe_column, servings_column = (
+        get_link_columns(model))
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {recipe_column} IN ({placeholders}) '
+            f'RETURNING {recipe_column}, {servings_column}',
+            [user.pk, *recipe_ids],
+        )
+        return dict(cursor.fetchall())
+
+
+@transaction.atomic
+def add_recipe(model, user, recipe_id, servings=1):
+    """Добавляет рецепт в избранное или корзину, False - уже там."""
+    added = insert_recipe_links(model, user, [recipe_id], servings)
+    if added:
+        apply_recipe_changes(model, user, added, 1)
+    return bool(added)
+
+
+@transaction.atomic
+def remove_recipe(model, user, recipe_id):
+    """Убирает рецепт из избранного или корзины, False - его там нет."""
+    removed = delete_recipe_links(model, user, [recipe_id])
+    if removed:
+        apply_recipe_changes(model, user, removed, -1)
+    return bool(removed)
+
+
+@transaction.atomic
+def set_servings(user, recipe_id, servings):
+    """Меняет число порций рецепта в корзине, False - рецепта там нет."""
+    cart = Shopping.objects.filter(user=user, recipe_id=recipe_id)
+    current = cart.select_for_update().values_list(
+        'servings', flat=True).first()
+    if current is None:
+        return False
+    if current != servings:
+        cart.update(servings=servings)
+        apply_recipe_changes(
+            Shopping, user, {recipe_id: servings - current}, 1)
+    return True
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids, servings=1):
+    """
+    Добавляет рецепты в избранное или корзину (model) одной вставкой.
+    Статус exists от not_found отличает предварительное чтение,
+    а добавленными считаются только строки, вставленные этим запросом.
+    Число запросов не зависит от длины списка.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    found = dict(Recipe.objects.filter(pk__in=recipe_ids).annotate(
+        present=Exists(model.objects.filter(user=user, recipe=OuterRef('pk')))
+    ).order_by().values_list('pk', 'present'))
+    added = insert_recipe_links(
+        model, user, [pk for pk, present in found.items() if not present],
+        servings)
+    if added:
+        apply_recipe_changes(model, user, added, 1)
+    return get_add_statuses(recipe_ids, found, added)
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids):
+    """Убирает рецепты из избранного или корзины одним удалением."""
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    removed = delete_recipe_links(model, user, recipe_ids)
+    if removed:
+        apply_recipe_changes(model, user, removed, -1)
+    return get_remove_statuses(recipe_ids, removed)
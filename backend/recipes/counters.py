@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from recipes.models import Favorite, Recipe
+from users.models import Follow
+
+User = get_user_model()
+
+# (модель со счетчиком, поле счетчика, что считаем, ссылка на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно меняет счетчик одним UPDATE c F-выражением,
+    без чтения строки и без ухода ниже нуля.
+    """
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """То же для нескольких строк сразу."""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def get_live_count(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def get_counter_drift():
+    """{'Recipe.favorites_count': число строк с неверным счетчиком}"""
+    return {
+        f'{model.__name__}.{field}': model.objects.annotate(
+            live=get_live_count(related_model, related_field)
+        ).exclude(**{field: F('live')}).count()
+        for model, field, related_model, related_field in COUNTERS
+    }
+
+
+def reconcile_counters():
+    """Пересчитывает все счетчики по связанным таблицам."""
+    with transaction.atomic():
+        return {
+            f'{model.__name__}.{field}': model.objects.update(
+                **{field: get_live_count(related_model, related_field)})
+            for model, field, related_model, related_field in COUNTERS
+        }
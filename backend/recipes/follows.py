@@ -0,0 +1,164 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from recipes.bulk import SELF, get_add_statuses, get_remove_statuses
+from recipes.counters import User, change_counters
+from recipes.memberships import invalidate_memberships
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow
+
+TIMELINE_BATCH_SIZE = 1000
+
+
+def add_to_timelines(user_ids, recipes):
+    """recipes: пары (id, pub_date)."""
+    recipes = list(recipes)
+    TimelineEntry.objects.bulk_create((
+        TimelineEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        for user_id in user_ids
+        for recipe_id, pub_date in recipes
+    ), batch_size=TIMELINE_BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_recipe(recipe):
+    """
+    Новый рецепт сразу раскладывается по лентам подписчиков автора.
+    Подписчики читаются из базы, а не из кэша: пропущенная запись
+    в ленте уже не появится.
+    """
+    if recipe.author_id is None:
+        return
+    add_to_timelines(
+        Follow.objects.filter(author_id=recipe.author_id).values_list(
+            'user_id', flat=True),
+        [(recipe.pk, recipe.pub_date)])
+
+
+def follows_added(user_id, author_ids):
+    """
+    Последствия новых подписок user_id: счетчики подписчиков, лента
+    и множество подписок. Вызывается для подписок из API и для
+    созданных через ORM (админка), см. recipes.signals.
+    """
+    change_counters(User, author_ids, 'followers_count', 1)
+    add_to_timelines([user_id], Recipe.objects.filter(
+        author_id__in=author_ids).values_list('pk', 'pub_date'))
+    invalidate_memberships('following', [user_id])
+
+
+def follows_removed(user_id, author_ids):
+    """То же для удаленных подписок, в том числе каскадом."""
+    change_counters(User, author_ids, 'followers_count', -1)
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids).delete()
+    invalidate_memberships('following', [user_id])
+
+
+def insert_follows(user, author_ids):
+    """
+    Одним INSERT ... ON CONFLICT DO NOTHING RETURNING подписывает user
+    на существующих авторов, кроме него самого, и возвращает id тех,
+    подписку на которых вставил именно этот запрос (как
+    recipes.bulk.insert_recipe_links).
+    """
+    author_ids = list(author_ids)
+    if not author_ids:
+        return set()
+    quote_name = connection.ops.quote_name
+    follows, users = Follow._meta, User._meta
+    user_pk = quote_name(users.pk.column)
+    user_column, author_column, created_column = (
+        quote_name(follows.get_field(name).column)
+        for name in ('user', 'author', 'created')
+    )
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote_name(follows.db_table)} '
+            f'({user_column}, {author_column}, {created_column}) '
+            f'SELECT %s, {user_pk}, %s '
+            f'FROM {quote_name(users.db_table)} '
+            f'WHERE {user_pk} IN ({placeholders}) AND {user_pk} <> %s '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {author_column}',
+            [
+                user.pk,
+                connection.ops.adapt_datetimefield_value(timezone.now()),
+                *author_ids,
+                user.pk,
+            ],
+        )
+        return {author_id for author_id, in cursor.fetchall()}
+
+
+def delete_follows(user, author_ids):
+    """
+    Одним DELETE ... RETURNING удаляет подписки user и возвращает
+    id авторов, подписку на которых удалил именно этот запрос.
+    """
+    author_ids = list(author_ids)
+    if not author_ids:
+        return set()
+    quote_name = connection.ops.quote_name
+    follows = Follow._meta
+    user_column, author_column = (
+        quote_name(follows.get_field(name).column)
+        for name in ('user', 'author')
+    )
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote_name(follows.db_table)} '
+            f'WHERE {user_column} = %s '
+            f'AND {author_column} IN ({placeholders}) '
+            f'RETURNING {author_column}',
+            [user.pk, *author_ids],
+        )
+        return {author_id for author_id, in cursor.fetchall()}
+
+
+@transaction.atomic
+def follow(user, author_ids):
+    """
+    Подписывает user на авторов author_ids, возвращает статус
+    по каждому (recipes.bulk). Счетчик подписчиков и ленту меняют
+    только подписки, вставленные этим запросом: параллельная
+    подписка на того же автора их не повторит.
+    """
+    author_ids = list(dict.fromkeys(author_ids))
+    # Сначала запись, потом чтение: транзакция сразу берет блокировку
+    # на запись, а exists от not_found отличает список найденных.
+    added = insert_follows(user, author_ids)
+    found = set(User.objects.filter(pk__in=author_ids).values_list(
+        'pk', flat=True))
+    if added:
+        follows_added(user.pk, added)
+    statuses = get_add_statuses(author_ids, found, added)
+    if user.pk in statuses:
+        statuses[user.pk] = SELF
+    return statuses
+
+
+@transaction.atomic
+def unfollow(user, author_ids):
+    """Отписывает user от авторов, возвращает статус по каждому."""
+    author_ids = list(dict.fromkeys(author_ids))
+    removed = delete_follows(user, author_ids)
+    if removed:
+        follows_removed(user.pk, removed)
+    return get_remove_statuses(author_ids, removed)
+
+
+def rebuild_timelines():
+    """Пересобирает ленты всех пользователей по подпискам."""
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        TimelineEntry.objects.bulk_create((
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id, recipe_id, pub_date in Recipe.objects.filter(
+                author__following__isnull=False
+            ).values_list(
+                'author__following__user', 'pk', 'pub_date'
+            ).iterator()
+        ), batch_size=TIMELINE_BATCH_SIZE)
+    return TimelineEntry.objects.count()
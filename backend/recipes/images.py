@@ -0,0 +1,173 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'method': 4},
+    'jpeg': {'format': 'JPEG', 'optimize': True, 'progressive': True},
+}
+
+# Что остается в info оригинала после очистки: прозрачность и анимация.
+ORIGINAL_INFO = ('transparency', 'duration', 'loop', 'background')
+
+renditions_built = Signal()
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images',
+)
+
+
+def open_image(file):
+    """
+    Открывает изображение, поворачивает по EXIF и переводит в RGB.
+    У результата нет метаданных: EXIF, ICC и прочее из info
+    в renditions не попадают.
+    """
+    with Image.open(file) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+    image.info.clear()
+    return image
+
+
+def strip_metadata(file, output):
+    """
+    Пересохраняет оригинал в том же формате в output без EXIF
+    (с геометкой), ICC, XMP и комментариев: ссылка на оригинал
+    тоже отдается клиентам. Поворот из EXIF переносится в пиксели,
+    JPEG сохраняет свои таблицы квантования. Анимация сохраняется
+    целиком, без поворота.
+    """
+    with Image.open(file) as image:
+        image_format = image.format
+        options = {}
+        if getattr(image, 'is_animated', False):
+            options['save_all'] = True
+        else:
+            ImageOps.exif_transpose(image, in_place=True)
+            if image_format == 'JPEG':
+                options = {'quality': 'keep', 'subsampling': 'keep'}
+            elif image_format == 'WEBP':
+                options = {'quality': settings.RECIPE_IMAGE_QUALITY}
+        image.info = {
+            key: value for key, value in image.info.items()
+            if key in ORIGINAL_INFO
+        }
+        image.save(output, image_format, **options)
+    return image_format
+
+
+def get_widths(image_width):
+    """Ширины из RECIPE_IMAGE_WIDTHS без увеличения исходника."""
+    widths = sorted({
+        min(width, image_width) for width in settings.RECIPE_IMAGE_WIDTHS
+    })
+    return widths or [image_width]
+
+
+def encode(image, file_format):
+    buffer = io.BytesIO()
+    image.save(
+        buffer, quality=settings.RECIPE_IMAGE_QUALITY,
+        **FORMATS[file_format])
+    return buffer.getvalue()
+
+
+def save_rendition(data, width, file_format):
+    """
+    Имя файла - хэш содержимого, поэтому файл никогда не меняется
+    и nginx может отдавать его с Cache-Control: immutable.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    name = f'{settings.RECIPE_IMAGE_DIR}/{digest}_{width}.{file_format}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def save_original(data, image_name):
+    """Очищенный оригинал рядом с загруженным, имя - хэш содержимого."""
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    directory, filename = os.path.split(image_name)
+    extension = os.path.splitext(filename)[1]
+    name = f'{directory}/{digest}{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def make_renditions(file):
+    """{'webp': {'320': имя файла, ...}, 'jpeg': {...}}"""
+    image = open_image(file)
+    renditions = {file_format: {} for file_format in FORMATS}
+    for width in get_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for file_format in FORMATS:
+            renditions[file_format][str(width)] = save_rendition(
+                encode(resized, file_format), width, file_format)
+    return renditions
+
+
+def build_renditions(recipe_id, image_name):
+    """
+    Очищает оригинал от метаданных, строит по нему renditions
+    и сохраняет их, только если у рецепта все еще то же изображение.
+    Тогда рецепт переходит на очищенный файл, а загруженный удаляется.
+    """
+    from recipes.models import Recipe
+
+    try:
+        output = io.BytesIO()
+        with default_storage.open(image_name) as file:
+            strip_metadata(file, output)
+        source = save_original(output.getvalue(), image_name)
+        output.seek(0)
+        renditions = make_renditions(output)
+        renditions['source'] = source
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=image_name
+        ).update(image=source, image_renditions=renditions)
+        if updated:
+            default_storage.delete(image_name)
+            renditions_built.send(
+                sender=Recipe, recipe_id=recipe_id, renditions=renditions)
+        return renditions
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение рецепта %s', recipe_id)
+        return None
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(recipe):
+    """
+    Декодирование и сжатие идут в пуле потоков после коммита,
+    ответ на запрос их не ждет.
+    """
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if settings.RECIPE_IMAGE_SYNC:
+        transaction.on_commit(
+            lambda: build_renditions(recipe_id, image_name))
+    else:
+        transaction.on_commit(
+            lambda: executor.submit(build_renditions, recipe_id, image_name))
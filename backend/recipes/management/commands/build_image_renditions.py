@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from recipes.images import build_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Строим уменьшенные копии изображений рецептов, у которых
+    их еще нет: для рецептов, загруженных до появления обработки,
+    или после смены RECIPE_IMAGE_WIDTHS (с --force).
+    """
+    help = 'Уменьшенные копии изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересобрать копии у всех рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            recipes = recipes.filter(image_renditions={})
+        built = failed = 0
+        for recipe_id, image_name in recipes.values_list(
+            'id', 'image'
+        ).iterator():
+            if build_renditions(recipe_id, image_name) is None:
+                failed += 1
+            else:
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {built}, с ошибкой: {failed}'))
@@ -0,0 +1,220 @@
+import random
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from recipes.counters import reconcile_counters
+from recipes.follows import rebuild_timelines
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping, ShoppingCartLine, Tag)
+from recipes.search import update_search_vectors
+from users.models import Follow
+
+User = get_user_model()
+
+WORDS = (
+    'борщ', 'салат', 'суп', 'пирог', 'рагу', 'плов', 'омлет', 'каша',
+    'запеканка', 'паста', 'котлеты', 'блины', 'сырники', 'соус', 'жаркое',
+    'домашний', 'быстрый', 'летний', 'острый', 'сытный', 'легкий',
+    'бабушкин', 'праздничный', 'овощной', 'грибной', 'куриный', 'рыбный',
+)
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена', 'Дмитрий',
+)
+LAST_NAMES = (
+    'Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Орлов',
+)
+
+
+def batched(objects, batch_size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    """
+    Наполняем базу синтетическими данными для нагрузочных замеров:
+    пользователи, рецепты с тегами и ингредиентами, избранное,
+    корзины и подписки. Все записи вставляются пачками через
+    bulk_create, поэтому сигналы не срабатывают: агрегат списков
+    покупок, счетчики, ленты подписок и поисковые векторы
+    пересчитываются в конце.
+    Теги и ингредиенты должны быть загружены заранее
+    (load_tags, load_ingredients).
+    """
+    help = 'Генерация тестовых данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=100, help='Число пользователей.')
+        parser.add_argument(
+            '--recipes', type=int, default=1000, help='Число рецептов.')
+        parser.add_argument(
+            '--ingredients', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'), help='Ингредиентов в рецепте.')
+        parser.add_argument(
+            '--tags', type=int, nargs=2, default=(1, 3),
+            metavar=('MIN', 'MAX'), help='Тегов у рецепта.')
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Избранных рецептов у пользователя, не больше.')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Рецептов в корзине пользователя, не больше.')
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок у пользователя, не больше.')
+        parser.add_argument(
+            '--prefix', default='fake',
+            help='Префикс username и email создаваемых пользователей.')
+        parser.add_argument(
+            '--seed', type=int, help='Зерно генератора для повторяемости.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для вставки.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not tag_ids or not ingredient_ids:
+            raise CommandError(
+                'Сначала загрузите теги и ингредиенты: '
+                'load_tags, load_ingredients.')
+
+        started = time.monotonic()
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'], options['prefix'])
+            recipe_ids = self.create_recipes(user_ids, options['recipes'])
+            counts = {
+                'пользователей': len(user_ids),
+                'рецептов': len(recipe_ids),
+                'ингредиентов в рецептах': self.create_ingredients(
+                    recipe_ids, ingredient_ids, options['ingredients']),
+                'тегов у рецептов': self.create_tags(
+                    recipe_ids, tag_ids, options['tags']),
+                'избранного': self.create_links(
+                    Favorite, user_ids, recipe_ids, options['favorites']),
+                'в корзинах': self.create_carts(
+                    user_ids, recipe_ids, options['carts']),
+                'подписок': self.create_follows(
+                    user_ids, options['follows']),
+            }
+            ShoppingCartLine.objects.rebuild()
+            reconcile_counters()
+            rebuild_timelines()
+            update_search_vectors()
+
+        elapsed = time.monotonic() - started
+        summary = ', '.join(
+            f'{name}: {count}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {elapsed:.1f} с: {summary}'))
+
+    def bulk_create(self, model, objects):
+        created = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            created += len(batch)
+        return created
+
+    def sample(self, population, bounds):
+        low, high = bounds
+        size = self.random.randint(min(low, high), max(low, high))
+        return self.random.sample(population, min(size, len(population)))
+
+    def create_users(self, count, prefix):
+        start = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(None)
+        usernames = [f'{prefix}{start + number}' for number in range(count)]
+        self.bulk_create(User, (
+            User(
+                username=username,
+                email=f'{username}@example.com',
+                password=password,
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+            )
+            for username in usernames
+        ))
+        return list(User.objects.filter(
+            username__in=usernames).values_list('id', flat=True))
+
+    def create_recipes(self, user_ids, count):
+        if not user_ids:
+            return []
+        last_id = Recipe.objects.aggregate(last=Max('id'))['last'] or 0
+        self.bulk_create(Recipe, (
+            Recipe(
+                name=' '.join(self.random.sample(WORDS, 2)).capitalize(),
+                author_id=self.random.choice(user_ids),
+                text=' '.join(self.random.choices(WORDS, k=20)),
+                cooking_time=self.random.randint(1, 100),
+            )
+            for _ in range(count)
+        ))
+        recipes = list(Recipe.objects.filter(id__gt=last_id).order_by('id'))
+        # pub_date заполняется auto_now_add, разносим даты вручную,
+        # чтобы лента и курсоры работали на разных значениях.
+        now = timezone.now()
+        for position, recipe in enumerate(reversed(recipes)):
+            recipe.pub_date = now - timedelta(minutes=position * 7)
+        Recipe.objects.bulk_update(
+            recipes, ('pub_date',), batch_size=self.batch_size)
+        return [recipe.id for recipe in recipes]
+
+    def create_ingredients(self, recipe_ids, ingredient_ids, bounds):
+        return self.bulk_create(IngredientRecipe, (
+            IngredientRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.sample(ingredient_ids, bounds)
+        ))
+
+    def create_tags(self, recipe_ids, tag_ids, bounds):
+        through = Recipe.tags.through
+        return self.bulk_create(through, (
+            through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.sample(tag_ids, bounds)
+        ))
+
+    def create_links(self, model, user_ids, recipe_ids, limit):
+        return self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in self.sample(recipe_ids, (0, limit))
+        ))
+
+    def create_carts(self, user_ids, recipe_ids, limit):
+        return self.bulk_create(Shopping, (
+            Shopping(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                servings=self.random.randint(1, 4),
+            )
+            for user_id in user_ids
+            for recipe_id in self.sample(recipe_ids, (0, limit))
+        ))
+
+    def create_follows(self, user_ids, limit):
+        return self.bulk_create(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.sample(user_ids, (0, limit))
+            if author_id != user_id
+        ))
@@ -1,22 +1,215 @@
-from csv import reader
+import csv
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
 
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'data', 'ingredients.csv'
+)
+FORMATS = ('csv', 'json')
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+class JSONStream:
+    """
+    Элементы массива JSON верхнего уровня по одному, без чтения всего
+    файла: буфер дочитывается кусками, пока raw_decode не разберет
+    очередной элемент. Файл без [ читается как JSON Lines.
+    Ошибка разбора - ValueError с номером элемента.
+    """
+    decoder = json.JSONDecoder()
+
+    def __init__(self, stream, chunk_size=JSON_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer, self.position, self.eof = '', 0, False
+
+    def fill(self):
+        chunk = self.stream.read(self.chunk_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position, self.eof = 0, not chunk
+
+    def peek(self):
+        """Первый непробельный символ с текущей позиции, '' в конце."""
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position].isspace()
+            ):
+                self.position += 1
+            if self.position < len(self.buffer) or self.eof:
+                return self.buffer[self.position:self.position + 1]
+            self.fill()
+
+    def decode(self, number):
+        while True:
+            try:
+                row, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                if self.eof:
+                    raise ValueError(f'элемент {number}: {error.msg}')
+                self.fill()
+                continue
+            # Элемент у самого конца буфера мог быть обрезан (число).
+            if end < len(self.buffer) or self.eof:
+                self.position = end
+                return row
+            self.fill()
+
+    def close_array(self, char):
+        if not char:
+            raise ValueError('массив не закрыт')
+        self.position += 1
+        if self.peek():
+            raise ValueError('лишние данные после массива')
+
+    def __iter__(self):
+        is_array = self.peek() == '['
+        if is_array:
+            self.position += 1
+        number = 0
+        while True:
+            char = self.peek()
+            if is_array and char in ('', ']'):
+                self.close_array(char)
+                return
+            if not char:
+                return
+            if is_array and number:
+                if char != ',':
+                    raise ValueError(f'после элемента {number} нет запятой')
+                self.position += 1
+                if self.peek() in ('', ']'):
+                    raise ValueError(f'запятая после элемента {number}')
+            number += 1
+            yield self.decode(number)
+
 
 class Command(BaseCommand):
     """
-    Добавляем ингредиенты из файла CSV.
+    Добавляем ингредиенты из файла CSV или JSON (массив или JSON Lines),
+    файл читается потоком.
+    Уже существующие пары (name, measurement_unit) пропускаются,
+    новые вставляются пачками: COPY на PostgreSQL, bulk_create на
+    остальных базах.
     """
     help = 'Загрузка ингредиентов'
 
-    def handle(self, *args, **kwargs):
-        with open(
-                'recipes/data/ingredients.csv', 'r',
-                encoding='UTF-8'
-        ) as ingredients:
-            for row in reader(ingredients):
-                if len(row) == 2:
-                    Ingredient.objects.get_or_create(
-                        name=row[0], measurement_unit=row[1],
-                    )
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к файлу, "-" для чтения из stdin.',
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла, по умолчанию по расширению (csv для stdin).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для вставки.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'json' if path.lower().endswith('.json') else 'csv')
+        started = time.monotonic()
+        if path == '-':
+            created, total = self.load(
+                sys.stdin, file_format, options['batch_size'])
+        else:
+            try:
+                with open(path, 'r', encoding='UTF-8') as ingredients:
+                    created, total = self.load(
+                        ingredients, file_format, options['batch_size'])
+            except OSError as error:
+                raise CommandError(error)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты загрузились! Прочитано: {total}, '
+            f'добавлено: {created}, {total / elapsed:.0f} строк/сек.'
+        ))
+
+    @staticmethod
+    def read_csv(ingredients):
+        for row in csv.reader(ingredients):
+            if len(row) == 2:
+                yield row[0], row[1]
+
+    @staticmethod
+    def read_json(ingredients):
+        """Массив [{"name": ..., "measurement_unit": ...}] или JSON Lines."""
+        rows = JSONStream(ingredients)
+        number = 0
+        try:
+            for number, row in enumerate(rows, 1):
+                name, measurement_unit = row['name'], row['measurement_unit']
+                if not isinstance(name, str) or not isinstance(
+                    measurement_unit, str
+                ):
+                    raise TypeError('name и measurement_unit - не строки')
+                yield name, measurement_unit
+        except ValueError as error:
+            raise CommandError(f'Неверный JSON: {error}.')
+        except (KeyError, TypeError) as error:
+            raise CommandError(
+                f'Запись {number}: нужен объект со строками name '
+                f'и measurement_unit ({error.__class__.__name__}: {error}).')
+
+    def load(self, ingredients, file_format, batch_size):
+        rows = getattr(self, f'read_{file_format}')(ingredients)
+        seen = set(Ingredient.objects.values_list('name', 'measurement_unit'))
+        total = created = 0
+
+        def new_rows():
+            nonlocal total
+            for name, measurement_unit in rows:
+                total += 1
+                key = (name.strip(), measurement_unit.strip())
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield key
+
+        insert = (
+            self.copy_batch if connection.vendor == 'postgresql'
+            else self.create_batch
+        )
+        new = new_rows()
+        with transaction.atomic():
+            while True:
+                batch = list(islice(new, batch_size))
+                if not batch:
+                    break
+                insert(batch)
+                created += len(batch)
+        return created, total
+
+    @staticmethod
+    def create_batch(batch):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in batch),
+            batch_size=len(batch),
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def copy_batch(batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {Ingredient._meta.db_table} '
+                '(name, measurement_unit) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
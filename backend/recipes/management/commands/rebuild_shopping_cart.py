@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import ShoppingCartLine
+
+
+class Command(BaseCommand):
+    """
+    Сверяем агрегат списков покупок с рецептами в корзинах
+    и пересобираем его.
+    """
+    help = 'Проверка и пересборка агрегата списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        live = ShoppingCartLine.objects.get_live_totals()
+        stored = dict(
+            ((user_id, ingredient_id), total)
+            for user_id, ingredient_id, total
+            in ShoppingCartLine.objects.values_list(
+                'user_id', 'ingredient_id', 'total')
+        )
+        drift = {
+            key for key in {*live, *stored}
+            if live.get(key, 0) != stored.get(key, 0)
+        }
+        for user_id, ingredient_id in sorted(drift):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'{stored.get((user_id, ingredient_id), 0)} != '
+                f'{live.get((user_id, ingredient_id), 0)}'
+            )
+        if options['check']:
+            if drift:
+                raise CommandError(f'Расхождений: {len(drift)}')
+            self.stdout.write(self.style.SUCCESS('Агрегат совпадает!'))
+            return
+        lines = ShoppingCartLine.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Агрегат пересобран, строк: {lines}, '
+            f'исправлено расхождений: {len(drift)}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from recipes.follows import rebuild_timelines
+
+
+class Command(BaseCommand):
+    """
+    Пересобираем ленты подписок по таблице подписок. Нужно после
+    bulk-вставок и правок подписок в обход API, например в админке.
+    """
+    help = 'Пересборка лент подписок'
+
+    def handle(self, *args, **options):
+        entries = rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {entries}'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.counters import get_counter_drift, reconcile_counters
+
+
+class Command(BaseCommand):
+    """
+    Сверяем денормализованные счетчики (favorites_count у рецептов,
+    recipes_count и followers_count у пользователей) с таблицами
+    и пересчитываем их. Расхождения появляются после bulk-вставок,
+    каскадных удалений и правок в обход API.
+    """
+    help = 'Проверка и пересчет счетчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        drift = get_counter_drift()
+        for counter, rows in drift.items():
+            self.stdout.write(f'{counter}: расхождений {rows}')
+        if options['check']:
+            total = sum(drift.values())
+            if total:
+                raise CommandError(f'Расхождений: {total}')
+            self.stdout.write(self.style.SUCCESS('Счетчики совпадают!'))
+            return
+        updated = reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(
+            'Счетчики пересчитаны: ' + ', '.join(
+                f'{counter} - {rows} строк'
+                for counter, rows in updated.items())))
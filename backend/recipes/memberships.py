@@ -0,0 +1,111 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Value
+from recipes.models import Favorite, Shopping
+from users.models import Follow
+
+# Множество: (модель связи, поле пользователя, поле с id в множестве)
+MEMBERSHIPS = {
+    'favorites': (Favorite, 'user_id', 'recipe_id'),
+    'cart': (Shopping, 'user_id', 'recipe_id'),
+    'following': (Follow, 'user_id', 'author_id'),
+}
+
+Memberships = namedtuple('Memberships', MEMBERSHIPS)
+
+EMPTY_MEMBERSHIPS = Memberships(*(frozenset() for _ in MEMBERSHIPS))
+
+
+def get_membership_key(kind, user_id):
+    return f'memberships:{kind}:{user_id}'
+
+
+def load_membership(kind, user_id):
+    model, user_field, id_field = MEMBERSHIPS[kind]
+    return frozenset(model.objects.filter(
+        **{user_field: user_id}).values_list(id_field, flat=True))
+
+
+def load_membership_sets(kinds, user_id):
+    """
+    Несколько множеств пользователя одним запросом UNION ALL:
+    каждая строка - (id, вид множества).
+    """
+    querysets = [
+        MEMBERSHIPS[kind][0].objects.filter(
+            **{MEMBERSHIPS[kind][1]: user_id}
+        ).annotate(kind=Value(kind, CharField())).order_by().values_list(
+            MEMBERSHIPS[kind][2], 'kind')
+        for kind in kinds
+    ]
+    if not querysets:
+        return {}
+    ids = {kind: set() for kind in kinds}
+    for pk, kind in querysets[0].union(*querysets[1:], all=True):
+        ids[kind].add(pk)
+    return {kind: frozenset(values) for kind, values in ids.items()}
+
+
+def is_membership_cache_enabled():
+    """
+    Кэш между запросами включен только с MEMBERSHIP_CACHE_TIMEOUT > 0,
+    по умолчанию - когда настроен общий для воркеров Redis.
+    Иначе множества читаются заново в каждом запросе.
+    """
+    return settings.MEMBERSHIP_CACHE_TIMEOUT > 0
+
+
+def get_membership(kind, user_id):
+    """Одно множество пользователя: из кэша или одним запросом."""
+    if not is_membership_cache_enabled():
+        return load_membership(kind, user_id)
+    key = get_membership_key(kind, user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = load_membership(kind, user_id)
+        cache.set(key, ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return ids
+
+
+def load_memberships(user_id):
+    """
+    Избранное, корзина и подписки пользователя. Все три множества
+    читаются из кэша за одно обращение, недостающие догружаются
+    из базы одним запросом.
+    """
+    if not is_membership_cache_enabled():
+        return Memberships(**load_membership_sets(MEMBERSHIPS, user_id))
+    keys = {kind: get_membership_key(kind, user_id) for kind in MEMBERSHIPS}
+    cached = cache.get_many(keys.values())
+    missing = {
+        keys[kind]: ids for kind, ids in load_membership_sets(
+            [kind for kind, key in keys.items() if key not in cached],
+            user_id).items()
+    }
+    if missing:
+        cached.update(missing)
+        cache.set_many(missing, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return Memberships(*(cached[keys[kind]] for kind in MEMBERSHIPS))
+
+
+def get_memberships(request):
+    """Множества текущего пользователя, один раз на запрос."""
+    if request is None or not request.user.is_authenticated:
+        return EMPTY_MEMBERSHIPS
+    memberships = getattr(request, '_memberships', None)
+    if memberships is None:
+        memberships = request._memberships = load_memberships(request.user.pk)
+    return memberships
+
+
+def invalidate_memberships(kind, user_ids):
+    """
+    Сбрасывает множества после коммита, чтобы параллельный запрос
+    не закэшировал их по еще не закоммиченным данным.
+    """
+    keys = [get_membership_key(kind, user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
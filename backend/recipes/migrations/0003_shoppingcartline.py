@@ -0,0 +1,64 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:10
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_cart_lines(apps, schema_editor):
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingCartLine = apps.get_model('recipes', 'ShoppingCartLine')
+    totals = IngredientRecipe.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values(
+        'ingredient_id', user_id=models.F('recipe__shopping_cart__user'),
+    ).annotate(total=models.Sum('amount')).order_by()
+    ShoppingCartLine.objects.bulk_create(
+        ShoppingCartLine(**row) for row in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ('name',), 'verbose_name': 'Ингредиент', 'verbose_name_plural': 'Ингредиенты'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredientrecipe',
+            options={'ordering': ['-id'], 'verbose_name': 'Ингреиент', 'verbose_name_plural': 'Ингредиенты рецепта'},
+        ),
+        migrations.AlterField(
+            model_name='ingredientrecipe',
+            name='amount',
+            field=models.PositiveSmallIntegerField(default=0, help_text='amount_ingredient', validators=[django.core.validators.MinValueValidator(1, 'Количество должно быть не меньше 1'), django.core.validators.MaxValueValidator(3000, 'Достаточное количество ингредиентов!')], verbose_name='amount'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingCartLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='total')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_lines', to='recipes.ingredient', verbose_name='ingredients')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_lines', to=settings.AUTH_USER_MODEL, verbose_name='users')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Строки списка покупок',
+                'ordering': ('-total',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartline',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='shopping_cart_line_unique'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_lines, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:39
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+SEARCH_INDEX = 'recipe_search_vector_idx'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    GIN-индекс по search_vector и заполнение векторов на PostgreSQL.
+    На SQLite колонка остается пустой, поиск идет по индексу в памяти.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    config = settings.RECIPE_SEARCH_CONFIG
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(search_vector=(
+        django.contrib.postgres.search.SearchVector(
+            'name', weight='A', config=config)
+        + django.contrib.postgres.search.SearchVector(
+            'text', weight='B', config=config)
+    ))
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} '
+        'ON recipes_recipe USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:48
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopping',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1, 'Порций должно быть не меньше 1'), django.core.validators.MaxValueValidator(100, 'Не больше 100 порций')], verbose_name='Порций'),
+        ),
+        migrations.AlterField(
+            model_name='shopping',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to=settings.AUTH_USER_MODEL, verbose_name='users'),
+        ),
+    ]
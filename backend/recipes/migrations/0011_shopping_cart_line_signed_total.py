@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_shopping_servings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoppingcartline',
+            name='total',
+            field=models.IntegerField(default=0, verbose_name='total'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.16 on 2026-10-17 07:06
+
+from django.db import migrations
+
+# Recipe.tags хранится в автоматической таблице recipes_recipe_tags,
+# а не в TagRecipe. Уникальный (recipe_id, tag_id) там уже покрывает
+# prefetch тегов, а фильтру ?tags= по тегу нужен обратный порядок:
+# по tag_id сразу берутся recipe_id без чтения таблицы.
+RECIPE_TAGS_INDEX = 'recipe_tags_tag_recipe_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_shopping_cart_line_signed_total'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='tagrecipe',
+            name='tag_recipe_recipe_tag_idx',
+        ),
+        migrations.RunSQL(
+            f'CREATE INDEX {RECIPE_TAGS_INDEX} '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            f'DROP INDEX {RECIPE_TAGS_INDEX}',
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.16 on 2026-10-17 09:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Повторы (name, measurement_unit) сливаются в ингредиент
+    с меньшим id: ссылки рецептов и строки списков покупок
+    переносятся на него, совпавшие количества складываются.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingCartLine = apps.get_model('recipes', 'ShoppingCartLine')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(count=Count('id'), keep=Min('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        keep = duplicate['keep']
+        others = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(pk=keep).values_list('pk', flat=True))
+        for model, owner, field in (
+            (IngredientRecipe, 'recipe_id', 'amount'),
+            (ShoppingCartLine, 'user_id', 'total'),
+        ):
+            for row in model.objects.filter(ingredient_id__in=others):
+                target = model.objects.filter(
+                    ingredient_id=keep, **{owner: getattr(row, owner)}
+                ).first()
+                if target is None:
+                    row.ingredient_id = keep
+                    row.save(update_fields=['ingredient'])
+                    continue
+                setattr(target, field,
+                        getattr(target, field) + getattr(row, field))
+                target.save(update_fields=[field])
+                row.delete()
+        Ingredient.objects.filter(pk__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_shoppingcartline_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='ingredient_name_unit_unique'),
+        ),
+    ]
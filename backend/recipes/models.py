@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import CASCADE, UniqueConstraint
+from django.db import connection, models, transaction
+from django.db.models import CASCADE, Sum, UniqueConstraint
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -54,6 +56,15 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        indexes = (
+            models.Index(fields=('name',), name='ingredient_name_idx'),
+        )
+        constraints = (
+            UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='ingredient_name_unit_unique',
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}.'
@@ -98,6 +109,22 @@ class Recipe(models.Model):
         blank=True,
         help_text='Изображение с фотографией блюда',
     )
+    image_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание блюда',
         max_length=250,
@@ -125,6 +152,19 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx',
+                condition=models.Q(author__isnull=False),
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_favorites_count_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -236,6 +276,10 @@ class Favorite(models.Model):
                 name='favorite_unique'
             )
         ]
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'), name='favorite_user_recipe_idx'),
+        )
 
     def __str__(self):
         return f'{self.recipe} {self.user}'
@@ -244,7 +288,8 @@ class Favorite(models.Model):
 class Shopping(models.Model):
     """
     Модель рецептов в корзине покупок, описываем:
-    'recipe', 'user'.
+    'recipe', 'user', 'servings'. В корзине сколько угодно рецептов,
+    количества ингредиентов рецепта умножаются на servings.
     """
     recipe = models.ForeignKey(
         Recipe,
@@ -252,12 +297,20 @@ class Shopping(models.Model):
         related_name='shopping_cart',
         on_delete=CASCADE,
     )
-    user = models.OneToOneField(
+    user = models.ForeignKey(
         User,
         verbose_name='users',
         related_name='shopping_cart',
         on_delete=CASCADE,
     )
+    servings = models.PositiveSmallIntegerField(
+        verbose_name='Порций',
+        default=1,
+        validators=(
+            MinValueValidator(1, 'Порций должно быть не меньше 1'),
+            MaxValueValidator(100, 'Не больше 100 порций'),
+        ),
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -269,6 +322,239 @@ class Shopping(models.Model):
                 name='shopping_recipe_user_unique'
             )
         ]
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'), name='shopping_user_recipe_idx'),
+        )
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Список покупок'
+
+
+class ShoppingCartLineManager(models.Manager):
+    """
+    Поддерживает агрегат списка покупок в актуальном состоянии:
+    изменения вносятся дельтами по ингредиентам, а не пересчетом.
+    """
+
+    def apply_deltas(self, user_ids, deltas, servings=None):
+        """
+        Прибавляет deltas {ingredient_id: amount} к строкам users,
+        умноженные на servings {user_id: порций}, если он передан.
+        Одним INSERT ... ON CONFLICT DO UPDATE на пачку строк: база сама
+        складывает дельту с текущим total, поэтому параллельные
+        изменения одной строки не теряются и не падают IntegrityError
+        на уникальности (user, ingredient). Строки с total <= 0
+        затем удаляются. ON CONFLICT есть в PostgreSQL и в SQLite 3.24+.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        servings = servings or {}
+        # Один порядок строк во всех запросах, чтобы не было взаимных
+        # блокировок между параллельными вставками.
+        rows = [
+            (user_id, ingredient_id, delta * servings.get(user_id, 1))
+            for user_id in user_ids
+            for ingredient_id, delta in sorted(deltas.items())
+        ]
+        fields = ('user', 'ingredient', 'total', 'updated')
+        meta = self.model._meta
+        quote_name = connection.ops.quote_name
+        table = quote_name(meta.db_table)
+        user_column, ingredient_column, total_column, updated_column = (
+            quote_name(meta.get_field(name).column) for name in fields
+        )
+        updated = connection.ops.adapt_datetimefield_value(timezone.now())
+        batch_size = connection.ops.bulk_batch_size(fields, rows)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                cursor.execute(
+                    f'INSERT INTO {table} ({user_column}, '
+                    f'{ingredient_column}, {total_column}, {updated_column}) '
+                    f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))} '
+                    f'ON CONFLICT ({user_column}, {ingredient_column}) '
+                    f'DO UPDATE SET {total_column} = '
+                    f'{table}.{total_column} + EXCLUDED.{total_column}, '
+                    f'{updated_column} = EXCLUDED.{updated_column}',
+                    [value for row in batch for value in (*row, updated)],
+                )
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas, total__lte=0
+            ).delete()
+
+    @staticmethod
+    def get_recipe_amounts(recipe_ids, servings=None):
+        """
+        Суммы ингредиентов рецептов, каждый рецепт умножен
+        на servings {recipe_id: порций}, если он передан.
+        """
+        servings = servings or {}
+        amounts = {}
+        for recipe_id, ingredient_id, amount in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id', 'amount'):
+            amounts[ingredient_id] = (
+                amounts.get(ingredient_id, 0)
+                + amount * servings.get(recipe_id, 1)
+            )
+        return amounts
+
+    def add_recipe(self, user, recipe, servings=1):
+        self.apply_deltas([user.pk], self.get_recipe_amounts(
+            [recipe.pk], {recipe.pk: servings}))
+
+    def remove_recipe(self, user, recipe, servings=1):
+        self.apply_deltas([user.pk], {
+            ingredient_id: -amount
+            for ingredient_id, amount in self.get_recipe_amounts(
+                [recipe.pk], {recipe.pk: servings}).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """
+        Переносит изменение состава рецепта во все корзины с ним,
+        с учетом числа порций в каждой.
+        """
+        servings = dict(Shopping.objects.filter(recipe=recipe).values_list(
+            'user_id', 'servings'))
+        self.apply_deltas(
+            servings,
+            {
+                ingredient_id: (
+                    new_amounts.get(ingredient_id, 0)
+                    - old_amounts.get(ingredient_id, 0)
+                )
+                for ingredient_id in {*old_amounts, *new_amounts}
+            },
+            servings,
+        )
+
+    @staticmethod
+    def get_live_totals():
+        """
+        Агрегат, посчитанный заново по рецептам в корзинах
+        одним запросом: Sum(amount * servings).
+        """
+        return {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in IngredientRecipe.objects.filter(
+                recipe__shopping_cart__isnull=False
+            ).values(
+                'ingredient_id',
+                user_id=models.F('recipe__shopping_cart__user'),
+            ).annotate(total=Sum(
+                models.F('amount') * models.F('recipe__shopping_cart__servings')
+            )).order_by()
+        }
+
+    def rebuild(self):
+        totals = self.get_live_totals()
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           total=total)
+                for (user_id, ingredient_id), total in totals.items()
+                if total > 0
+            )
+        return len(totals)
+
+
+class ShoppingCartLine(models.Model):
+    """
+    Агрегат списка покупок: суммарное количество ингредиента
+    во всех рецептах корзины пользователя, описываем:
+    'user', 'ingredient', 'total'.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='users',
+        related_name='shopping_cart_lines',
+        on_delete=CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='ingredients',
+        related_name='shopping_cart_lines',
+        on_delete=CASCADE,
+    )
+    # Не Positive: при сложении дельт итог может на миг стать
+    # отрицательным, такие строки apply_deltas сразу удаляет.
+    total = models.IntegerField(
+        verbose_name='total',
+        default=0,
+    )
+    # Время последнего изменения строки: по нему и числу строк
+    # считается ETag выгрузки без чтения самого списка.
+    updated = models.DateTimeField(
+        verbose_name='updated',
+        auto_now=True,
+    )
+
+    objects = ShoppingCartLineManager()
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списка покупок'
+        ordering = ('-total',)
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='shopping_cart_line_unique'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient.name} - {self.total}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Лента подписок: рецепты авторов, на которых подписан пользователь.
+    Заполняется при публикации рецепта (fan-out on write) и при
+    подписке, поэтому лента читается по индексу (user, -pub_date)
+    без соединения со всеми подписками, описываем:
+    'user', 'recipe', 'pub_date'.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='users',
+        related_name='timeline',
+        on_delete=CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='recipes',
+        related_name='timeline_entries',
+        on_delete=CASCADE,
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+        ordering = ('-pub_date', '-recipe')
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='timeline_entry_unique'
+            )
+        ]
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
@@ -0,0 +1,109 @@
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from recipes.models import IngredientRecipe
+
+
+class RecipeIngredientIndex:
+    """
+    Индекс рецепт -> ингредиенты в памяти процесса для поиска
+    «что приготовить из того, что есть». Для каждого ингредиента
+    хранится список позиций рецептов (posting list), для каждого
+    рецепта - число его ингредиентов. Совпадения считаются
+    Counter.update по спискам, без соединения таблиц в SQL.
+
+    Сбрасывается сигналами IngredientRecipe и Recipe после коммита
+    и по истечении RECIPE_MATCH_INDEX_TTL. Пока один поток
+    пересобирает индекс, остальные отвечают по прошлой версии.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._version = 0
+
+    def invalidate(self):
+        self._version += 1
+
+    def _build(self):
+        version = self._version
+        positions, recipe_ids, totals = {}, array('Q'), array('H')
+        postings = {}
+        for recipe_id, ingredient_id in IngredientRecipe.objects.order_by(
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            position = positions.get(recipe_id)
+            if position is None:
+                position = positions[recipe_id] = len(recipe_ids)
+                recipe_ids.append(recipe_id)
+                totals.append(0)
+            totals[position] += 1
+            postings.setdefault(ingredient_id, array('I')).append(position)
+        return {
+            'built': time.monotonic(),
+            'version': version,
+            'recipe_ids': recipe_ids,
+            'totals': totals,
+            'postings': postings,
+        }
+
+    def _is_fresh(self, state):
+        return (
+            state is not None and state['version'] == self._version
+            and time.monotonic() - state['built']
+            < settings.RECIPE_MATCH_INDEX_TTL
+        )
+
+    def _get_state(self):
+        state = self._state
+        if self._is_fresh(state):
+            return state
+        if not self._lock.acquire(blocking=state is None):
+            return state
+        try:
+            state = self._state
+            if not self._is_fresh(state):
+                state = self._state = self._build()
+        finally:
+            self._lock.release()
+        return state
+
+    def match(self, ingredient_ids, max_missing=None, limit=None):
+        """
+        [(recipe_id, совпало, всего)] рецептов хотя бы с одним
+        из ingredient_ids: сначала с большей долей имеющихся
+        ингредиентов, затем с меньшим числом недостающих.
+        """
+        if limit is None:
+            limit = settings.RECIPE_MATCH_LIMIT
+        state = self._get_state()
+        postings, totals = state['postings'], state['totals']
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+        # Ключ сортировки зависит только от (совпало, всего), таких пар
+        # немного: рецепты раскладываются по ним, а сортируются пары.
+        buckets = {}
+        for position, count in matched.items():
+            buckets.setdefault((count, totals[position]), []).append(position)
+        recipe_ids = state['recipe_ids']
+        found = []
+        for count, total in sorted(
+            buckets, key=lambda pair: (-pair[0] / pair[1], pair[1] - pair[0])
+        ):
+            if max_missing is not None and total - count > max_missing:
+                continue
+            bucket = sorted(
+                (recipe_ids[position] for position in buckets[count, total]),
+                reverse=True)
+            found.extend(
+                (recipe_id, count, total)
+                for recipe_id in bucket[:limit - len(found)])
+            if len(found) >= limit:
+                break
+        return found
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
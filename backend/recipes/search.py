@@ -0,0 +1,171 @@
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
+from recipes.models import Recipe
+
+TOKEN_RE = re.compile(r'\w+')
+# Вес совпадения в названии и в описании, как веса A и B в tsvector.
+WEIGHTS = {'name': 1.0, 'text': 0.4}
+PREFIX_MATCH_WEIGHT = 0.5
+
+
+def get_search_vector():
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('text', weight='B', config=config)
+    )
+
+
+def update_search_vectors(recipe_ids=None):
+    """
+    Пересчитывает search_vector одним UPDATE на стороне базы.
+    Только для PostgreSQL, на SQLite ищет индекс в памяти.
+    """
+    if connection.vendor != 'postgresql':
+        return 0
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    return recipes.update(search_vector=get_search_vector())
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+class RecipeSearchIndex:
+    """
+    Обратный индекс рецептов в памяти процесса для SQLite,
+    где нет полнотекстового поиска. Слово запроса совпадает со всеми
+    словами индекса, которые с него начинаются (грубая замена
+    стемминга), рецепт должен содержать все слова запроса.
+    Релевантность - tf-idf с весами WEIGHTS. Сбрасывается сигналами
+    Recipe и по истечении RECIPE_SEARCH_INDEX_TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        self._state = None
+
+    def _build(self):
+        postings = {}
+        recipes = 0
+        for recipe_id, *fields in Recipe.objects.values_list(
+            'id', *WEIGHTS
+        ).iterator():
+            recipes += 1
+            for field, text in zip(WEIGHTS, fields):
+                for token in tokenize(text):
+                    scores = postings.setdefault(token, {})
+                    scores[recipe_id] = (
+                        scores.get(recipe_id, 0) + WEIGHTS[field])
+        return {
+            'built': time.monotonic(),
+            'recipes': recipes,
+            'terms': sorted(postings),
+            'postings': postings,
+        }
+
+    @staticmethod
+    def _is_fresh(state):
+        return state is not None and (
+            time.monotonic() - state['built']
+            < settings.RECIPE_SEARCH_INDEX_TTL
+        )
+
+    def _get_state(self):
+        state = self._state
+        if not self._is_fresh(state):
+            with self._lock:
+                state = self._state
+                if not self._is_fresh(state):
+                    state = self._state = self._build()
+        return state
+
+    def get_token_scores(self, state, token):
+        """
+        {recipe_id: tf-idf} по всем словам, начинающимся с token.
+        Точное совпадение слова весит больше совпадения по началу.
+        """
+        terms, postings = state['terms'], state['postings']
+        weights = {}
+        position = bisect_left(terms, token)
+        while position < len(terms) and terms[position].startswith(token):
+            term = terms[position]
+            factor = 1 if term == token else PREFIX_MATCH_WEIGHT
+            for recipe_id, weight in postings[term].items():
+                weights[recipe_id] = max(
+                    weights.get(recipe_id, 0), weight * factor)
+            position += 1
+        if not weights:
+            return weights
+        idf = math.log(1 + state['recipes'] / len(weights))
+        return {
+            recipe_id: weight * idf for recipe_id, weight in weights.items()
+        }
+
+    def search(self, query, limit=None):
+        """[(recipe_id, релевантность)] по убыванию релевантности."""
+        if limit is None:
+            limit = settings.RECIPE_SEARCH_LIMIT
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        state = self._get_state()
+        found = None
+        for token in sorted(tokens, key=len, reverse=True):
+            scores = self.get_token_scores(state, token)
+            if found is None:
+                found = scores
+            else:
+                found = {
+                    recipe_id: score + scores[recipe_id]
+                    for recipe_id, score in found.items()
+                    if recipe_id in scores
+                }
+            if not found:
+                return []
+        return sorted(
+            found.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты queryset, подходящие под query, с релевантностью в rank,
+    отсортированные по ней. На PostgreSQL - search_vector с GIN-индексом
+    и ts_rank, на SQLite - индекс в памяти, найденные id и их
+    релевантность передаются в запрос. В обоих случаях страница
+    рецептов читается одним запросом.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=settings.RECIPE_SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-rank', '-id')
+    found = recipe_search_index.search(query)
+    if not found:
+        return queryset.none()
+    recipe_ids = [recipe_id for recipe_id, _ in found]
+    return queryset.filter(pk__in=recipe_ids).annotate(
+        rank=Case(
+            *(When(pk=recipe_id, then=Value(score))
+              for recipe_id, score in found),
+            output_field=FloatField(),
+        ),
+    ).order_by('-rank', '-id')
@@ -0,0 +1,126 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from recipes.autocomplete import ingredient_index
+from recipes.counters import User, change_counter, change_counters
+from recipes.follows import fan_out_recipe, follows_added, follows_removed
+from recipes.images import schedule_renditions
+from recipes.memberships import invalidate_memberships
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping, ShoppingCartLine)
+from recipes.pantry import recipe_ingredient_index
+from recipes.search import recipe_search_index, update_search_vectors
+from users.models import Follow
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_cart_lines(sender, instance, **kwargs):
+    """Удаленный рецепт вычитается из списков покупок до каскада."""
+    ShoppingCartLine.objects.change_recipe(
+        instance, ShoppingCartLine.objects.get_recipe_amounts([instance.pk]),
+        {}
+    )
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_favorites_from_counters(sender, instance, **kwargs):
+    """
+    Избранное удаляемого пользователя вычитается из счетчиков
+    рецептов одним UPDATE до каскада.
+    """
+    change_counters(Recipe, Favorite.objects.filter(
+        user=instance).values('recipe_id'), 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_shopping_cart_lines(sender, instance, created, **kwargs):
+    """Переименованный ингредиент меняет ETag выгрузки списков."""
+    if not created:
+        ShoppingCartLine.objects.filter(ingredient=instance).update(
+            updated=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_renditions(sender, instance, **kwargs):
+    """Новое изображение уходит в фоновую обработку после коммита."""
+    if (
+        instance.image
+        and instance.image_renditions.get('source') != instance.image.name
+    ):
+        schedule_renditions(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_author_recipes_count(sender, instance, created, **kwargs):
+    if created and instance.author_id is not None:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_author_recipes_count(sender, instance, **kwargs):
+    if instance.author_id is not None:
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_follow(sender, instance, created, **kwargs):
+    """
+    Подписка через ORM (админка). API пишет подписки сырым SQL
+    без сигналов и вызывает follows_added само.
+    """
+    if created:
+        follows_added(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow(sender, instance, **kwargs):
+    """Удаление подписки из админки или каскадом с пользователем."""
+    follows_removed(instance.user_id, [instance.author_id])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_favorites_set(sender, instance, **kwargs):
+    invalidate_memberships('favorites', [instance.user_id])
+
+
+@receiver(post_save, sender=Shopping)
+@receiver(post_delete, sender=Shopping)
+def invalidate_cart_set(sender, instance, **kwargs):
+    invalidate_memberships('cart', [instance.user_id])
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    update_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_search_index(sender, **kwargs):
+    recipe_search_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def invalidate_recipe_ingredient_index(sender, **kwargs):
+    """
+    Состав рецепта пишется bulk_create без сигналов, но всегда
+    вместе с сохранением рецепта, поэтому хватает post_save Recipe.
+    """
+    transaction.on_commit(recipe_ingredient_index.invalidate)
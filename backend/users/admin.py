@@ -2,6 +2,7 @@ from django.conf import settings
 from django.contrib import admin
 from django.contrib.admin import ModelAdmin, register
 from django.contrib.auth import get_user_model
+from recipes.admin_filters import AutocompleteFilterMixin, autocomplete_filter
 from users.models import Follow, User
 
 User = get_user_model()
@@ -9,14 +10,29 @@ User = get_user_model()
 
 @admin.register(User)
 class UserAdmin(ModelAdmin):
-    list_display = ('username', 'email', 'password', 'first_name')
-    list_filter = ('first_name', 'email',)
-    search_fields = ('username', 'email',)
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
+    list_filter = ('is_staff', 'is_active',)
+    search_fields = ('username', 'email', 'first_name', 'last_name',)
+    readonly_fields = ('recipes_count', 'followers_count',)
+    show_full_result_count = False
     empty_value = settings.EMPTY_VALUE
 
 
 @register(Follow)
-class FollowAdmin(ModelAdmin):
+class FollowAdmin(AutocompleteFilterMixin, ModelAdmin):
     list_display = ('user', 'author', 'created',)
-    search_fields = ('user__email', 'user__email',)
+    list_select_related = ('user', 'author')
+    list_filter = (autocomplete_filter('user'),
+                   autocomplete_filter('author'))
+    search_fields = ('user__email', 'author__email',)
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
     empty_value = settings.EMPTY_VALUE
+
+    # Счетчик и ленту ведут сигналы создания и удаления подписки,
+    # поэтому у существующей подписки пару не меняем.
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ('user', 'author')
+        return ()
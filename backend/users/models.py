@@ -27,6 +27,14 @@ class User(AbstractUser):
     first_name = models.CharField(
         'Имя',
         max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов',
+        default=0,
+        editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        editable=False)
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -67,6 +75,12 @@ class Follow(models.Model):
                 fields=['user', 'author'],
                 name='unique_follower')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'),
+            models.Index(
+                fields=['user', '-created'], name='follow_user_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} - {self.author}'